@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Benchmark per-epoch iteration overhead of the minibatch loaders.
+
+Compares ``DataLoader(TensorDataset(...))`` with ``TensorBatchLoader`` for
+the batch layouts used by the trainers: ``(x, y)`` trial tensors (GRU /
+trialwise MHA), ``(x, z, y)`` with the trial-level regressor, and
+trial-context windows built from shared base tensors.  Only iteration is
+timed (no model), so the numbers are the pure loader cost of one epoch.
+
+Example:
+    python scripts/bench_batch_loader.py --trials 2000 --time-bins 299 \\
+        --batch-size 32 --epochs 5
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "src"))
+sys.path.insert(0, str(REPO_ROOT / "src" / "mha"))
+
+from mha_model_utils import TrialContextDataset
+
+from utils.data import TensorBatchLoader
+
+
+def _epoch_seconds(loader, epochs: int) -> float:
+    for _ in loader:  # warm-up
+        pass
+    best = float("inf")
+    for _ in range(epochs):
+        t0 = time.perf_counter()
+        for batch in loader:
+            batch[0].sum()  # touch the batch so lazy views are not free
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=2000)
+    parser.add_argument("--time-bins", type=int, default=299)
+    parser.add_argument("--input-size", type=int, default=94)
+    parser.add_argument("--output-size", type=int, default=64)
+    parser.add_argument("--trial-features", type=int, default=4)
+    parser.add_argument("--context-len", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    n, t = args.trials, args.time_bins
+    x = torch.randn(n, t, args.input_size)
+    y = torch.randn(n, t, args.output_size)
+    z = torch.randn(n, args.trial_features)
+
+    context = TrialContextDataset(x, y, args.context_len, z_trials=z)
+    # DataLoader side: the tensors wrapped in TensorDataset, or the dataset
+    # itself (per-sample __getitem__ + default collation).
+    layouts = {
+        "(x, y)": (TensorDataset(x, y), (x, y)),
+        "(x, z, y)": (TensorDataset(x, z, y), (x, z, y)),
+        "trial-context": (context, (context,)),
+    }
+
+    print(
+        f"Torch {torch.__version__} | N={n} T={t} B={args.batch_size} "
+        f"epochs={args.epochs}"
+    )
+    print(
+        f"\n  {'layout':<14s} {'shuffle':<8s} {'DataLoader':>11s} "
+        f"{'TensorBatch':>12s} {'speedup':>8s}"
+    )
+    for name, (dataset, tb_args) in layouts.items():
+        for shuffle in (False, True):
+            dl = DataLoader(dataset, batch_size=args.batch_size, shuffle=shuffle)
+            tb = TensorBatchLoader(
+                *tb_args, batch_size=args.batch_size, shuffle=shuffle
+            )
+            dl_sec = _epoch_seconds(dl, args.epochs)
+            tb_sec = _epoch_seconds(tb, args.epochs)
+            print(
+                f"  {name:<14s} {shuffle!s:<8s} {dl_sec * 1e3:8.1f} ms "
+                f"{tb_sec * 1e3:9.1f} ms {dl_sec / tb_sec:7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
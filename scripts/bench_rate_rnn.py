@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Benchmark the reference vs fused recurrence of the vanilla rate RNNs.
+
+Times a no-grad forward pass and a forward+backward pass for
+VanillaRateRNN and VanillaRateRNNNeural with ``fused=False`` and
+``fused=True`` on identical weights, and reports the max absolute
+difference between the two paths.
+
+Example:
+    python scripts/bench_rate_rnn.py --batch-size 256 --time-bins 299
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "src"))
+
+from rnn_utils import VanillaRateRNN, VanillaRateRNNNeural
+
+
+def _time_call(fn, repeats: int) -> float:
+    fn()  # warm-up
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_model(cls, args) -> None:
+    torch.manual_seed(args.seed)
+    model = cls(
+        input_size=args.input_size,
+        hidden_size=args.hidden_size,
+        output_size=args.output_size,
+    )
+    x = torch.randn(args.batch_size, args.time_bins, args.input_size)
+
+    def forward_no_grad():
+        with torch.no_grad():
+            return model(x)
+
+    def forward_backward():
+        model.zero_grad(set_to_none=True)
+        out, h_hist = model(x)
+        (out.square().mean() + h_hist.square().mean()).backward()
+
+    timings = {}
+    outputs = {}
+    for fused in (False, True):
+        model.fused = fused
+        outputs[fused] = forward_no_grad()
+        timings[fused] = (
+            _time_call(forward_no_grad, args.repeats),
+            _time_call(forward_backward, args.repeats),
+        )
+
+    max_out_diff = (outputs[False][0] - outputs[True][0]).abs().max().item()
+    max_h_diff = (outputs[False][1] - outputs[True][1]).abs().max().item()
+
+    print(f"\n{cls.__name__}")
+    print(f"  {'mode':<8s} {'fwd (no grad)':>14s} {'fwd+bwd':>10s}")
+    for fused in (False, True):
+        fwd, fwd_bwd = timings[fused]
+        label = "fused" if fused else "loop"
+        print(f"  {label:<8s} {fwd * 1e3:11.1f} ms {fwd_bwd * 1e3:7.1f} ms")
+    print(
+        f"  speedup  {timings[False][0] / timings[True][0]:11.2f} x "
+        f"{timings[False][1] / timings[True][1]:7.2f} x"
+    )
+    print(f"  max |Δ output| = {max_out_diff:.3e} | max |Δ h| = {max_h_diff:.3e}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--time-bins", type=int, default=299)
+    parser.add_argument("--input-size", type=int, default=94)
+    parser.add_argument("--hidden-size", type=int, default=128)
+    parser.add_argument("--output-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    print(
+        f"Torch {torch.__version__} | threads={torch.get_num_threads()} | "
+        f"B={args.batch_size} T={args.time_bins} H={args.hidden_size}"
+    )
+    for cls in (VanillaRateRNN, VanillaRateRNNNeural):
+        bench_model(cls, args)
+
+
+if __name__ == "__main__":
+    main()
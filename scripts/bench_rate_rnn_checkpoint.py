@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Benchmark activation checkpointing of the vanilla rate RNN recurrence.
+
+For each ``checkpoint_segment`` (``none`` = plain fused scan) this times a
+forward+backward pass of VanillaRateRNNNeural and measures its memory:
+``held`` is what the autograd graph retains after the forward pass (the
+activations checkpointing removes) and ``peak`` the high-water mark over
+the whole step.  Every setting runs in a fresh spawned process.  On Linux
+the numbers come from /proc/self/status, with glibc's mmap threshold
+lowered so freed tensors go back to the OS (otherwise RSS is dominated by
+allocator reuse); elsewhere only the max-RSS growth is reported.  On CUDA
+the allocator's own counters are used.  Gradients are checked against the
+un-checkpointed model.
+
+Example:
+    python scripts/bench_rate_rnn_checkpoint.py --hidden-size 512 \\
+        --batch-size 256 --time-bins 299 --segments none 10 25 50 100
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "src"))
+
+from rnn_utils import VanillaRateRNNNeural
+
+_PROC_STATUS = Path("/proc/self/status")
+
+
+def _proc_status_mb(key: str) -> float:
+    for line in _PROC_STATUS.read_text().splitlines():
+        if line.startswith(key + ":"):
+            return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+class _HostMemory:
+    def current(self) -> float:
+        if _PROC_STATUS.exists():
+            return _proc_status_mb("VmRSS")
+        return float("nan")
+
+    def reset_peak(self) -> None:
+        if _PROC_STATUS.exists():
+            # Writing 5 to clear_refs resets VmHWM to the current RSS.
+            Path("/proc/self/clear_refs").write_text("5")
+
+    def peak(self) -> float:
+        if _PROC_STATUS.exists():
+            return _proc_status_mb("VmHWM")
+        # ru_maxrss is in KiB on Linux, bytes on macOS.
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+class _CudaMemory:
+    def current(self) -> float:
+        torch.cuda.synchronize()
+        return torch.cuda.memory_allocated() / 2**20
+
+    def reset_peak(self) -> None:
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+
+    def peak(self) -> float:
+        torch.cuda.synchronize()
+        return torch.cuda.max_memory_allocated() / 2**20
+
+
+def _run_setting(args, segment, queue) -> None:
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    device = torch.device(args.device)
+    torch.manual_seed(args.seed)
+    model = VanillaRateRNNNeural(
+        input_size=args.input_size,
+        hidden_size=args.hidden_size,
+        output_size=args.output_size,
+        fused=True,
+        checkpoint_segment=segment,
+    ).to(device)
+    x = torch.randn(args.batch_size, args.time_bins, args.input_size, device=device)
+    # Allocate the gradient buffers up front so they are not counted.
+    for p in model.parameters():
+        p.grad = torch.zeros_like(p)
+    mem = _CudaMemory() if device.type == "cuda" else _HostMemory()
+
+    def step():
+        model.zero_grad(set_to_none=False)
+        out, h_hist = model(x)
+        held = mem.current()
+        (out.square().mean() + h_hist.square().mean()).backward()
+        return held
+
+    step()  # warm-up
+    mem.reset_peak()
+    base = mem.current()
+    held = step() - base
+    peak = mem.peak() - base
+
+    best = float("inf")
+    for _ in range(args.repeats):
+        t0 = time.perf_counter()
+        step()
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        best = min(best, time.perf_counter() - t0)
+
+    grads = [p.grad.detach().cpu().clone() for p in model.parameters()]
+    queue.put((held, peak, best, grads))
+
+
+def _measure(args, segment):
+    # Read by glibc at process start, so it must be set before spawning.
+    os.environ.setdefault("MALLOC_MMAP_THRESHOLD_", "65536")
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_setting, args=(args, segment, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--time-bins", type=int, default=299)
+    parser.add_argument("--input-size", type=int, default=94)
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--output-size", type=int, default=64)
+    parser.add_argument(
+        "--segments",
+        nargs="+",
+        default=["none", "10", "25", "50", "100"],
+        help="Checkpoint segment lengths to compare ('none' = no checkpointing)",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    segments = [None if s.lower() == "none" else int(s) for s in args.segments]
+    if None not in segments:
+        segments.insert(0, None)
+
+    print(
+        f"Torch {torch.__version__} | device={args.device} | "
+        f"B={args.batch_size} T={args.time_bins} H={args.hidden_size}"
+    )
+    results = {seg: _measure(args, seg) for seg in segments}
+    ref_held, ref_peak, ref_time, ref_grads = results[None]
+
+    print(
+        f"\n  {'segment':<8s} {'held':>9s} {'peak':>9s} {'saved (held/peak)':>18s} "
+        f"{'fwd+bwd':>10s} {'slowdown':>9s} {'max |Δ grad|':>13s}"
+    )
+    for seg in segments:
+        held, peak, sec, grads = results[seg]
+        grad_diff = max((g - r).abs().max().item() for g, r in zip(grads, ref_grads))
+        label = "none" if seg is None else str(seg)
+        saved_held = 1.0 - held / ref_held if ref_held > 0 else float("nan")
+        saved_peak = 1.0 - peak / ref_peak if ref_peak > 0 else float("nan")
+        print(
+            f"  {label:<8s} {held:6.0f} MB {peak:6.0f} MB "
+            f"{saved_held:8.1%} / {saved_peak:6.1%} "
+            f"{sec * 1e3:7.1f} ms {sec / ref_time:8.2f}x {grad_diff:13.3e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
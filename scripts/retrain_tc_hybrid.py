@@ -8,7 +8,6 @@ import uuid
 from datetime import datetime
 from pathlib import Path
 
-import numpy as np
 import pandas as pd
 import torch
 
@@ -16,6 +15,8 @@ REPO_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(REPO_ROOT / "src"))
 sys.path.insert(0, str(REPO_ROOT / "src" / "mha"))
 
+from utils.data import load_dmat_trials
+
 EPOCHS = 500
 PATIENCE = 500
 PRINT_EVERY = 10
@@ -66,13 +67,7 @@ def pick_device():
 def load_dmat(session_label):
     dmat_file = SESSIONS[session_label]["dmat"]
     path = REPO_ROOT / "data" / dmat_file
-    d = np.load(path)
-    x = d["X"].astype(np.float32)
-    y = d["Y"].astype(np.float32)
-    n_bins = 299
-    n_trials = x.shape[0] // n_bins
-    x = x[: n_trials * n_bins].reshape(n_trials, n_bins, x.shape[1])
-    y = y[: n_trials * n_bins].reshape(n_trials, n_bins, y.shape[1])
+    x, y = load_dmat_trials(path, bins_per_trial=299, truncate=True)
     return x, y, path
 
 
@@ -117,6 +117,30 @@ def _build_parser() -> argparse.ArgumentParser:
         default="all",
         help="Architecture to sweep: vanilla_rnn, lstm, or all (default)",
     )
+    p.add_argument(
+        "--results-format",
+        choices=["csv", "sqlite"],
+        default="csv",
+        help="Results backend: append-only CSV (default) or SQLite database",
+    )
+    p.add_argument(
+        "--n-workers",
+        type=int,
+        default=1,
+        help="Worker processes training configs in parallel (1 = sequential)",
+    )
+    p.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=1,
+        help="torch intra-op threads per worker process when --n-workers > 1",
+    )
+    p.add_argument(
+        "--precision",
+        choices=["fp32", "bf16", "fp16"],
+        default="fp32",
+        help="Training precision; bf16 runs autocast on CPU (recorded per run)",
+    )
     return p
 
 
@@ -129,11 +153,13 @@ def main() -> None:
     if str(src) not in sys.path:
         sys.path.insert(0, str(src))
 
+    from results_store import read_results
     from sweep import (
         generate_refined_search_configs,
         generate_search_configs,
         run_sweep,
     )
+    from utils.data import load_dmat_trials
 
     random.seed(args.seed)
     np.random.seed(args.seed)
@@ -155,68 +181,27 @@ def main() -> None:
         else (repo / "results")
     )
     results_dir.mkdir(parents=True, exist_ok=True)
+    results_ext = ".db" if args.results_format == "sqlite" else ".csv"
     results_csv_by_arch = {
-        "vanilla_rnn": str(results_dir / "sweep_results_vanilla_rnn.csv"),
-        "lstm": str(results_dir / "sweep_results_lstm.csv"),
+        "vanilla_rnn": str(results_dir / f"sweep_results_vanilla_rnn{results_ext}"),
+        "lstm": str(results_dir / f"sweep_results_lstm{results_ext}"),
     }
 
-    dmat_data = np.load(dmat_path)
-    if "X" not in dmat_data.files or "Y" not in dmat_data.files:
-        raise ValueError(f"DMAT file {dmat_path} must contain both 'X' and 'Y' arrays.")
-    x_dmat = dmat_data["X"].astype(np.float32)
-    y_dmat = dmat_data["Y"].astype(np.float32)
-    if x_dmat.shape[0] != y_dmat.shape[0]:
-        raise ValueError(
-            f"DMAT X/Y row mismatch: X rows={x_dmat.shape[0]} vs Y rows={y_dmat.shape[0]}. "
-            "Cannot align input/output."
-        )
+    # 2D (rows, features) and 3D (features, bins, trials) DMATs are both
+    # converted once into a float32 (trials, bins, features) .npy cache that
+    # is memory-mapped read-only on every later start.
+    n_bins_per_trial = int(args.dmat_bins_per_trial)
+    if n_bins_per_trial <= 0:
+        raise ValueError("--dmat-bins-per-trial must be > 0.")
+    x_dmat_reshaped, y_dmat_reshaped = load_dmat_trials(
+        dmat_path, bins_per_trial=n_bins_per_trial
+    )
+    n_bins_per_trial = int(x_dmat_reshaped.shape[1])
     print(
-        f"Using DMAT formatted targets: X shape={tuple(x_dmat.shape)}, Y shape={tuple(y_dmat.shape)}"
+        f"Using DMAT formatted targets (trials, bins, features): "
+        f"X shape={tuple(x_dmat_reshaped.shape)}, Y shape={tuple(y_dmat_reshaped.shape)}"
     )
 
-    if x_dmat.ndim == 2:
-        n_rows, n_regressors = x_dmat.shape
-        n_bins_per_trial = int(args.dmat_bins_per_trial)
-        if n_bins_per_trial <= 0:
-            raise ValueError("--dmat-bins-per-trial must be > 0.")
-        if n_rows % n_bins_per_trial != 0:
-            raise ValueError(
-                f"DMAT X has shape {x_dmat.shape}; rows are not divisible by "
-                f"bins_per_trial={n_bins_per_trial}. "
-                "Set --dmat-bins-per-trial to the correct value."
-            )
-        n_trials_dmat = n_rows // n_bins_per_trial
-        x_dmat_reshaped = x_dmat.reshape(n_trials_dmat, n_bins_per_trial, n_regressors)
-        n_target_dims = y_dmat.shape[1]
-        y_dmat_reshaped = y_dmat.reshape(n_trials_dmat, n_bins_per_trial, n_target_dims)
-    elif x_dmat.ndim == 3:
-        # Expected explicit layout: (predictors, bins, trials) -> (trials, bins, predictors)
-        n_predictors, n_bins_per_trial, n_trials_dmat = x_dmat.shape
-        x_dmat_reshaped = np.transpose(x_dmat, (2, 1, 0))
-        if y_dmat.ndim != 3:
-            raise ValueError(
-                f"When DMAT X is 3D, DMAT Y must also be 3D. Got X={x_dmat.shape}, Y={y_dmat.shape}."
-            )
-        y_predictors, y_bins, y_trials = y_dmat.shape
-        if (y_bins, y_trials) != (n_bins_per_trial, n_trials_dmat):
-            raise ValueError(
-                f"3D DMAT X/Y mismatch: X bins/trials=({n_bins_per_trial}, {n_trials_dmat}) vs "
-                f"Y bins/trials=({y_bins}, {y_trials})."
-            )
-        y_dmat_reshaped = np.transpose(y_dmat, (2, 1, 0))
-        print(
-            f"Detected 3D DMAT X shape {tuple(x_dmat.shape)} as "
-            f"(predictors, bins, trials)=({n_predictors}, {n_bins_per_trial}, {n_trials_dmat})."
-        )
-        print(
-            f"Detected 3D DMAT Y shape {tuple(y_dmat.shape)} as "
-            f"(targets, bins, trials)=({y_predictors}, {y_bins}, {y_trials})."
-        )
-    else:
-        raise ValueError(
-            f"Unsupported DMAT X shape {x_dmat.shape}; expected 2D or 3D array."
-        )
-
     if (
         x_dmat_reshaped.shape[0] != y_dmat_reshaped.shape[0]
         or x_dmat_reshaped.shape[1] != y_dmat_reshaped.shape[1]
@@ -235,8 +220,8 @@ def main() -> None:
 
     # Option 2: use full within-trial time course from DMAT X/Y.
     # Keep (n_trials, n_bins, features/targets) so semantics match GRU-style setup.
-    x_neural_trials = x_dmat_reshaped.astype(np.float32)
-    y_neural_trials = y_dmat_reshaped.astype(np.float32)
+    x_neural_trials = x_dmat_reshaped
+    y_neural_trials = y_dmat_reshaped
     target_key = "dmat_Y_timecourse"
     n_trials = int(x_neural_trials.shape[0])
     if n_trials < 2:
@@ -297,6 +282,7 @@ def main() -> None:
             cfg["target_aggregation"] = "timecourse"
             cfg["data_root"] = str(data_root)
             cfg["architecture"] = architecture
+            cfg["precision"] = args.precision
         return configs
 
     row_metadata = {
@@ -363,6 +349,8 @@ def main() -> None:
             results_csv=results_csv_by_arch["vanilla_rnn"],
             patience=args.patience,
             print_every=args.print_every,
+            n_workers=args.n_workers,
+            threads_per_worker=args.threads_per_worker,
         )
     else:
         print("No unseen vanilla_rnn configs selected; skipping vanilla sweep.")
@@ -381,6 +369,8 @@ def main() -> None:
             results_csv=results_csv_by_arch["lstm"],
             patience=args.lstm_patience,
             print_every=args.print_every,
+            n_workers=args.n_workers,
+            threads_per_worker=args.threads_per_worker,
         )
     else:
         print("No unseen lstm configs selected; skipping LSTM sweep.")
@@ -388,9 +378,8 @@ def main() -> None:
     # quick post-run summary
     frames = []
     for arch, csv_path in results_csv_by_arch.items():
-        p = Path(csv_path)
-        if p.exists() and p.stat().st_size > 0:
-            df_arch = pd.read_csv(p)
+        df_arch = read_results(csv_path)
+        if not df_arch.empty:
             if "architecture" not in df_arch.columns:
                 df_arch["architecture"] = arch
             frames.append(df_arch)
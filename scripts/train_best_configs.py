@@ -20,6 +20,8 @@ REPO_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(REPO_ROOT / "src"))
 sys.path.insert(0, str(REPO_ROOT / "src" / "mha"))
 
+from utils.data import TensorBatchLoader, load_dmat_trials
+
 EPOCHS = 500
 PATIENCE_RNN = 500
 PATIENCE_LSTM = 500
@@ -243,13 +245,7 @@ def pick_device():
 def load_dmat(session_label: str):
     dmat_file = SESSIONS[session_label]["dmat"]
     path = REPO_ROOT / "data" / dmat_file
-    d = np.load(path)
-    x = d["X"].astype(np.float32)
-    y = d["Y"].astype(np.float32)
-    n_bins = 299
-    n_trials = x.shape[0] // n_bins
-    x = x[: n_trials * n_bins].reshape(n_trials, n_bins, x.shape[1])
-    y = y[: n_trials * n_bins].reshape(n_trials, n_bins, y.shape[1])
+    x, y = load_dmat_trials(path, bins_per_trial=299, truncate=True)
     return x, y, path
 
 
@@ -451,8 +447,7 @@ def train_mha_vanilla(entry, device):
 
 def train_gru(entry, device):
     import importlib.util
-    from scipy.stats import pearsonr
-    from torch.utils.data import TensorDataset, DataLoader
+    from utils.metrics import StreamingPearson
 
     spec = importlib.util.spec_from_file_location(
         "gru_model", str(REPO_ROOT / "src" / "gru" / "model.py")
@@ -481,25 +476,22 @@ def train_gru(entry, device):
     optimizer = torch.optim.AdamW(model.parameters(), lr=float(cfg["learning_rate"]))
     criterion = torch.nn.MSELoss()
 
-    train_loader = DataLoader(
-        TensorDataset(x_tr_t, y_tr_t), batch_size=batch_size, shuffle=False
+    train_loader = TensorBatchLoader(
+        x_tr_t, y_tr_t, batch_size=batch_size, shuffle=False
     )
-    val_loader = DataLoader(TensorDataset(x_val_t, y_val_t), batch_size=batch_size)
+    val_loader = TensorBatchLoader(x_val_t, y_val_t, batch_size=batch_size)
 
     print(f"  Model params: {sum(p.numel() for p in model.parameters()):,}")
     print(f"  Data: train={x_tr_t.shape}, val={x_val_t.shape}")
 
     def check_r2(loader):
         model.eval()
-        y_all, p_all = [], []
+        acc = StreamingPearson()
         with torch.no_grad():
             for xb, yb in loader:
                 out, _ = model(xb, h=None)
-                y_all.append(yb.cpu())
-                p_all.append(out.cpu())
-        y_all = torch.cat(y_all, 0).flatten().numpy()
-        p_all = torch.cat(p_all, 0).flatten().numpy()
-        return float(pearsonr(y_all, p_all).statistic)
+                acc.update(yb, out)
+        return acc.result()
 
     t0 = time.perf_counter()
     val_r2_hist, train_r2_hist, val_loss_hist = [], [], []
@@ -8,6 +8,7 @@ same format used by other sweep CSVs, so the evaluation notebook picks them up.
 import argparse
 import importlib.util
 import json
+import sys
 import time
 import uuid
 from datetime import datetime
@@ -17,10 +18,12 @@ import numpy as np
 import pandas as pd
 import torch
 import torch.nn as nn
-from scipy.stats import pearsonr
-from torch.utils.data import DataLoader, TensorDataset
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from utils.data import TensorBatchLoader, load_dmat_trials
+from utils.metrics import StreamingPearson
 
 EPOCHS = 200
 PATIENCE = 30
@@ -54,13 +57,7 @@ def _dict_product(d):
 def load_dmat(session_label):
     dmat_file = SESSIONS[session_label]["dmat"]
     path = REPO_ROOT / "data" / dmat_file
-    d = np.load(path)
-    x = d["X"].astype(np.float32)
-    y = d["Y"].astype(np.float32)
-    n_bins = 299
-    n_trials = x.shape[0] // n_bins
-    x = x[: n_trials * n_bins].reshape(n_trials, n_bins, x.shape[1])
-    y = y[: n_trials * n_bins].reshape(n_trials, n_bins, y.shape[1])
+    x, y = load_dmat_trials(path, bins_per_trial=299, truncate=True)
     return x, y
 
 
@@ -91,16 +88,13 @@ def load_gru_class():
 
 def check_r2(model, loader, device):
     model.eval()
-    y_all, p_all = [], []
+    acc = StreamingPearson()
     with torch.no_grad():
         for xb, yb in loader:
             xb, yb = xb.to(device), yb.to(device)
             out, _ = model(xb, h=None)
-            y_all.append(yb.cpu())
-            p_all.append(out.cpu())
-    y_flat = torch.cat(y_all).flatten().numpy()
-    p_flat = torch.cat(p_all).flatten().numpy()
-    return float(pearsonr(y_flat, p_flat).statistic)
+            acc.update(yb, out)
+    return acc.result()
 
 
 def train_one(cfg, x_tr, y_tr, x_val, y_val, device, RateGRU):
@@ -124,10 +118,10 @@ def train_one(cfg, x_tr, y_tr, x_val, y_val, device, RateGRU):
     optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=weight_decay)
     criterion = nn.MSELoss()
 
-    train_loader = DataLoader(
-        TensorDataset(x_tr_t, y_tr_t), batch_size=batch_size, shuffle=False
+    train_loader = TensorBatchLoader(
+        x_tr_t, y_tr_t, batch_size=batch_size, shuffle=False
     )
-    val_loader = DataLoader(TensorDataset(x_val_t, y_val_t), batch_size=batch_size)
+    val_loader = TensorBatchLoader(x_val_t, y_val_t, batch_size=batch_size)
 
     val_r2_hist, train_r2_hist, val_loss_hist = [], [], []
     best_val_r2, best_epoch, no_improve = -np.inf, 0, 0
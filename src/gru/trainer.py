@@ -5,8 +5,8 @@ adapted from cs 231's solver class
 import numpy as np
 import pickle
 import torch
-from torch.utils.data import TensorDataset, DataLoader
-from scipy.stats import pearsonr
+from utils.data import TensorBatchLoader
+from utils.metrics import StreamingPearson
 import copy
 import optuna
 import os
@@ -47,13 +47,14 @@ class Trainer:
             raise ValueError("Extra arguments %s" % extra_kwargs)
 
         # dataloaders
-        self.train_loader = DataLoader(
-            TensorDataset(data["X_train"], data["Y_train"]),
+        self.train_loader = TensorBatchLoader(
+            data["X_train"],
+            data["Y_train"],
             batch_size=self.batch_size,
             shuffle=False,
         )
-        self.val_loader = DataLoader(
-            TensorDataset(data["X_val"], data["Y_val"]), batch_size=self.batch_size
+        self.val_loader = TensorBatchLoader(
+            data["X_val"], data["Y_val"], batch_size=self.batch_size
         )
 
         # book-keeping
@@ -98,8 +99,7 @@ class Trainer:
     def check_r2(self, data_loader, chunk_size=100):
         self.model.eval()
 
-        y_eval = []
-        y_pred = []
+        acc = StreamingPearson()
 
         with torch.no_grad():
             for x_batch, y_batch in data_loader:
@@ -109,13 +109,9 @@ class Trainer:
 
                 out, _ = self.model(x_batch, h=None)
 
-                y_eval.append(y_batch.cpu())
-                y_pred.append(out.cpu())
+                acc.update(y_batch, out)
 
-        y_eval = torch.cat(y_eval, dim=0)
-        y_pred = torch.cat(y_pred, dim=0)
-
-        r2 = pearsonr(y_eval.flatten().numpy(), y_pred.flatten().numpy()).statistic
+        r2 = acc.result()
 
         return r2
 
@@ -1,13 +1,17 @@
-import copy
 import math
-from typing import Any, Dict, Optional, Tuple
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from scipy.stats import pearsonr
-from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data import Dataset
+
+from utils.checkpoint import BestStateBuffer
+from utils.data import TensorBatchLoader
+from utils.metrics import StreamingPearson, pearson_r
+from utils.precision import autocast, check_precision, grad_scaler
 
 
 def extract_trial_features(
@@ -60,6 +64,131 @@ def extract_trial_features(
     return np.concatenate(parts, axis=1)
 
 
+def _attention_mask(
+    attention_type: str, attn_window: Optional[int], t: int, device: torch.device
+) -> Optional[torch.Tensor]:
+    """Boolean ``(t, t)`` mask, True where a query may *not* attend to a key."""
+    if attention_type == "full":
+        return None
+    idx = torch.arange(t, device=device)
+    col = idx.view(1, -1)
+    row = idx.view(-1, 1)
+    if attention_type == "causal":
+        invalid = col > row
+    elif attention_type == "local":
+        if attn_window is None:
+            raise ValueError("attention_type='local' requires attn_window")
+        invalid = (col > row) | ((row - col) >= int(attn_window))
+    else:
+        raise ValueError(f"Unknown attention_type: {attention_type}")
+    return invalid
+
+
+# Minimum number of attn_window-sized chunks in a sequence before local
+# attention switches to the banded kernel.  Below that the dense masked
+# path is as fast; against scaled_dot_product_attention (which does not
+# materialize the scores on CPU) the crossover is later.  Measured on CPU
+# with attn_window=20: per-head 2.2x faster at T=299, fused 1.5x at T=1000.
+_BANDED_MIN_CHUNKS = 8
+_BANDED_MIN_CHUNKS_FUSED = 32
+
+
+def _use_banded(
+    attention_type: str,
+    attn_window: Optional[int],
+    t: int,
+    min_chunks: Optional[int] = None,
+) -> bool:
+    """Whether local attention over *t* steps runs through ``_banded_attention``."""
+    if attention_type != "local" or attn_window is None:
+        return False
+    if min_chunks is None:
+        min_chunks = _BANDED_MIN_CHUNKS
+    return t >= min_chunks * attn_window
+
+
+def _banded_mask(n_chunks: int, window: int, device: torch.device) -> torch.Tensor:
+    """Boolean ``(n_chunks, window, 2 * window)`` mask for ``_banded_attention``.
+
+    True where a query may *not* attend to a key.  Query ``r`` of chunk ``m``
+    sits at ``m * window + r`` and key ``s`` at ``(m - 1) * window + s``, so
+    the band ``r < s <= r + window`` is the same for every chunk; only the
+    first chunk also blocks the left padding (``s < window``).
+    """
+    r = torch.arange(window, device=device).view(-1, 1)
+    s = torch.arange(2 * window, device=device).view(1, -1)
+    invalid = ((s <= r) | (s > r + window)).expand(n_chunks, -1, -1).clone()
+    invalid[0] |= s < window
+    return invalid
+
+
+def _banded_attention(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    window: int,
+    mask: torch.Tensor,
+    dropout: nn.Module,
+) -> torch.Tensor:
+    """Local causal attention in O(T * window) time and memory.
+
+    *q*, *k*, *v* are ``(..., T, d)``.  Queries are split into chunks of
+    *window* steps; each chunk scores only the ``2 * window`` keys that can
+    fall inside its band (taken from the left-padded keys with ``unfold``,
+    a view), instead of all T.  *mask* is
+    ``_banded_mask(ceil(T / window), window)``.  Matches the dense masked
+    computation to float round-off.
+    """
+    t, d = q.shape[-2:]
+    n_chunks = -(-t // window)
+    pad = n_chunks * window - t
+    q = F.pad(q, (0, 0, 0, pad)).unflatten(-2, (n_chunks, window))
+    # (..., n_chunks, d, 2 * window)
+    k = F.pad(k, (0, 0, window, pad)).unfold(-2, 2 * window, window)
+    v = F.pad(v, (0, 0, window, pad)).unfold(-2, 2 * window, window)
+    scores = torch.matmul(q, k) / math.sqrt(d)
+    scores = scores.masked_fill(mask, float("-inf"))
+    attn = dropout(F.softmax(scores, dim=-1))
+    out = torch.matmul(attn, v.transpose(-1, -2))
+    return out.flatten(-3, -2)[..., :t, :]
+
+
+def _grown_buffer(
+    module: nn.Module,
+    name: str,
+    t: int,
+    device: torch.device,
+    dtype: torch.dtype,
+    build,
+) -> torch.Tensor:
+    """Buffer *name* of *module*, rebuilt as ``build(t, device)`` when needed.
+
+    The buffer covers the longest length seen so far; callers slice the
+    first *t* entries.  It is only rebuilt for a longer *t* or a different
+    *device* / *dtype*, so fixed-length inputs reuse one tensor.
+    """
+    buf = getattr(module, name)
+    if buf.size(0) < t or buf.device != device or buf.dtype != dtype:
+        buf = build(t, device).to(dtype)
+        setattr(module, name, buf)
+    return buf
+
+
+def _sinusoidal_positional_encoding(
+    t: int, d: int, device: torch.device
+) -> torch.Tensor:
+    pos = torch.arange(t, device=device, dtype=torch.float32).unsqueeze(1)
+    div = torch.exp(
+        torch.arange(0, d, 2, device=device, dtype=torch.float32)
+        * (-math.log(10000.0) / d)
+    )
+    pe = torch.zeros(t, d, device=device)
+    pe[:, 0::2] = torch.sin(pos * div)
+    if d > 1:
+        pe[:, 1::2] = torch.cos(pos * div[: (d // 2)])
+    return pe
+
+
 class AttentionHead(nn.Module):
     def __init__(
         self,
@@ -78,28 +207,30 @@ class AttentionHead(nn.Module):
         self.attn_window = attn_window
 
     def _build_mask(self, t: int, device: torch.device) -> Optional[torch.Tensor]:
-        if self.attention_type == "full":
-            return None
-        idx = torch.arange(t, device=device)
-        col = idx.view(1, -1)
-        row = idx.view(-1, 1)
-        if self.attention_type == "causal":
-            invalid = col > row
-        elif self.attention_type == "local":
-            if self.attn_window is None:
-                raise ValueError("attention_type='local' requires attn_window")
-            invalid = (col > row) | ((row - col) >= int(self.attn_window))
-        else:
-            raise ValueError(f"Unknown attention_type: {self.attention_type}")
-        return invalid
+        if _use_banded(self.attention_type, self.attn_window, t):
+            return _banded_mask(-(-t // self.attn_window), self.attn_window, device)
+        return _attention_mask(self.attention_type, self.attn_window, t, device)
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(
+        self, x: torch.Tensor, mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        """*mask* (True = blocked) overrides the one built from the settings.
+
+        Local attention on long sequences runs banded (``_banded_attention``)
+        and then takes a ``_banded_mask``.
+        """
         q = self.q_proj(x)
         k = self.k_proj(x)
         v = self.v_proj(x)
+        t = x.size(1)
+        if _use_banded(self.attention_type, self.attn_window, t):
+            if mask is None:
+                mask = self._build_mask(t, x.device)
+            return _banded_attention(q, k, v, self.attn_window, mask, self.dropout)
         scale = math.sqrt(q.size(-1))
         scores = torch.bmm(q, k.transpose(1, 2)) / scale
-        mask = self._build_mask(scores.size(-1), scores.device)
+        if mask is None:
+            mask = self._build_mask(scores.size(-1), scores.device)
         if mask is not None:
             scores = scores.masked_fill(mask.unsqueeze(0), float("-inf"))
         attn = F.softmax(scores, dim=-1)
@@ -108,6 +239,30 @@ class AttentionHead(nn.Module):
 
 
 class MultiHeadSelfAttention(nn.Module):
+    """Multi-head self-attention.
+
+    The reference path runs a list of ``AttentionHead`` modules and
+    concatenates their outputs.  ``fused=True`` instead uses one packed
+    ``qkv_proj`` (rows ordered q, k, v, each split into heads in head order),
+    reshapes to ``(batch, heads, time, head_dim)`` and calls
+    ``F.scaled_dot_product_attention``, with ``is_causal`` for causal
+    attention so the flash / memory-efficient kernels can be used.  Outputs
+    match the reference path to float round-off.
+
+    Both layouts load from either kind of ``state_dict``: per-head weights
+    (``heads.{i}.{q,k,v}_proj.*``) are packed on load into a fused module and
+    vice versa, so checkpoints trained with the per-head modules can be
+    served with ``fused=True``.
+
+    The attention mask is kept in a non-persistent buffer and only rebuilt
+    when a longer sequence (or another device) comes in, so the per-head
+    path no longer builds a ``(T, T)`` mask per head per call.
+
+    ``attention_type="local"`` on sequences much longer than ``attn_window``
+    runs banded on both paths (``_banded_attention``): O(T * attn_window)
+    instead of a masked ``(T, T)`` score matrix.
+    """
+
     def __init__(
         self,
         d_model: int,
@@ -115,32 +270,117 @@ class MultiHeadSelfAttention(nn.Module):
         dropout: float = 0.0,
         attention_type: str = "full",
         attn_window: Optional[int] = None,
+        fused: bool = False,
     ):
         super().__init__()
         if d_model % n_heads != 0:
             raise ValueError(
                 f"d_model ({d_model}) must be divisible by n_heads ({n_heads})."
             )
+        if attention_type not in ("full", "causal", "local"):
+            raise ValueError(f"Unknown attention_type: {attention_type}")
         head_dim = d_model // n_heads
-        self.heads = nn.ModuleList(
-            [
-                AttentionHead(
-                    d_model=d_model,
-                    head_dim=head_dim,
-                    dropout=dropout,
-                    attention_type=attention_type,
-                    attn_window=attn_window,
-                )
-                for _ in range(n_heads)
-            ]
-        )
+        self.n_heads = n_heads
+        self.head_dim = head_dim
+        self.attention_type = attention_type
+        self.attn_window = attn_window
+        self.attn_dropout = dropout
+        self.fused = fused
+        if fused:
+            self.qkv_proj = nn.Linear(d_model, 3 * d_model)
+        else:
+            self.heads = nn.ModuleList(
+                [
+                    AttentionHead(
+                        d_model=d_model,
+                        head_dim=head_dim,
+                        dropout=dropout,
+                        attention_type=attention_type,
+                        attn_window=attn_window,
+                    )
+                    for _ in range(n_heads)
+                ]
+            )
         self.out_proj = nn.Linear(d_model, d_model)
         self.dropout = nn.Dropout(dropout)
+        self.register_buffer(
+            "_mask_cache", torch.empty(0, 0, dtype=torch.bool), persistent=False
+        )
+        self.register_buffer(
+            "_band_cache", torch.empty(0, 0, 0, dtype=torch.bool), persistent=False
+        )
+
+    def _build_mask(self, t: int, device: torch.device) -> torch.Tensor:
+        invalid = _attention_mask(self.attention_type, self.attn_window, t, device)
+        # scaled_dot_product_attention takes True = may attend.
+        return ~invalid if self.fused else invalid
+
+    def _banded(self, t: int) -> bool:
+        min_chunks = _BANDED_MIN_CHUNKS_FUSED if self.fused else _BANDED_MIN_CHUNKS
+        return _use_banded(self.attention_type, self.attn_window, t, min_chunks)
+
+    def _mask(self, t: int, device: torch.device) -> Optional[torch.Tensor]:
+        if self.attention_type == "full":
+            return None
+        if self.fused and self.attention_type == "causal":
+            return None  # handled by is_causal
+        if self._banded(t):
+            n_chunks = -(-t // self.attn_window)
+            band = _grown_buffer(
+                self,
+                "_band_cache",
+                n_chunks,
+                device,
+                torch.bool,
+                lambda n, dev: _banded_mask(n, self.attn_window, dev),
+            )
+            return band[:n_chunks]
+        mask = _grown_buffer(
+            self, "_mask_cache", t, device, torch.bool, self._build_mask
+        )
+        return mask[:t, :t]
+
+    def _fused_attention(self, x: torch.Tensor) -> torch.Tensor:
+        bsz, t, d_model = x.shape
+        qkv = self.qkv_proj(x).view(bsz, t, 3, self.n_heads, self.head_dim)
+        q, k, v = qkv.permute(2, 0, 3, 1, 4).unbind(0)
+        if self._banded(t):
+            mask = self._mask(t, x.device)
+            out = _banded_attention(q, k, v, self.attn_window, mask, self.dropout)
+            return out.transpose(1, 2).reshape(bsz, t, d_model)
+        out = F.scaled_dot_product_attention(
+            q,
+            k,
+            v,
+            attn_mask=self._mask(t, x.device),
+            dropout_p=self.attn_dropout if self.training else 0.0,
+            is_causal=self.attention_type == "causal",
+        )
+        return out.transpose(1, 2).reshape(bsz, t, d_model)
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
-        concat = torch.cat([h(x) for h in self.heads], dim=-1)
+        if self.fused:
+            concat = self._fused_attention(x)
+        else:
+            mask = self._mask(x.size(1), x.device)
+            concat = torch.cat([h(x, mask) for h in self.heads], dim=-1)
         return self.dropout(self.out_proj(concat))
 
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Convert between the per-head and packed layouts in place, so
+        # strict loading sees the keys this module expects.
+        names = ("q_proj", "k_proj", "v_proj")
+        heads = range(self.n_heads)
+        for p in ("weight", "bias"):
+            packed = f"{prefix}qkv_proj.{p}"
+            per_head = [f"{prefix}heads.{i}.{n}.{p}" for n in names for i in heads]
+            if self.fused and all(k in state_dict for k in per_head):
+                state_dict[packed] = torch.cat([state_dict.pop(k) for k in per_head])
+            elif not self.fused and packed in state_dict:
+                chunks = state_dict.pop(packed).chunk(len(per_head))
+                state_dict.update(zip(per_head, chunks))
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
 
 class AttentionBlock(nn.Module):
     def __init__(
@@ -151,6 +391,7 @@ class AttentionBlock(nn.Module):
         dropout: float = 0.1,
         attention_type: str = "full",
         attn_window: Optional[int] = None,
+        fused_attention: bool = False,
     ):
         super().__init__()
         self.norm1 = nn.LayerNorm(d_model)
@@ -160,6 +401,7 @@ class AttentionBlock(nn.Module):
             dropout=dropout,
             attention_type=attention_type,
             attn_window=attn_window,
+            fused=fused_attention,
         )
         self.norm2 = nn.LayerNorm(d_model)
         self.ff = nn.Sequential(
@@ -189,8 +431,10 @@ class NeuralAttentionRegressor(nn.Module):
         use_positional_encoding: bool = False,
         attention_type: str = "full",
         attn_window: Optional[int] = None,
+        fused_attention: bool = False,
     ):
         super().__init__()
+        self.d_model = d_model
         self.use_positional_encoding = use_positional_encoding
         self.in_proj = nn.Linear(input_dim, d_model)
         self.blocks = nn.ModuleList(
@@ -202,33 +446,32 @@ class NeuralAttentionRegressor(nn.Module):
                     dropout=dropout,
                     attention_type=attention_type,
                     attn_window=attn_window,
+                    fused_attention=fused_attention,
                 )
                 for _ in range(n_layers)
             ]
         )
         self.norm = nn.LayerNorm(d_model)
         self.out_proj = nn.Linear(d_model, output_dim)
-
-    def _sinusoidal_positional_encoding(
-        self, t: int, d: int, device: torch.device
-    ) -> torch.Tensor:
-        pos = torch.arange(t, device=device, dtype=torch.float32).unsqueeze(1)
-        div = torch.exp(
-            torch.arange(0, d, 2, device=device, dtype=torch.float32)
-            * (-math.log(10000.0) / d)
+        self.register_buffer("_pe_cache", torch.empty(0, d_model), persistent=False)
+
+    def _positional_encoding(self, t: int, device: torch.device) -> torch.Tensor:
+        """Cached ``(t, d_model)`` float32 encoding (see ``_grown_buffer``)."""
+        pe = _grown_buffer(
+            self,
+            "_pe_cache",
+            t,
+            device,
+            torch.float32,
+            lambda n, dev: _sinusoidal_positional_encoding(n, self.d_model, dev),
         )
-        pe = torch.zeros(t, d, device=device)
-        pe[:, 0::2] = torch.sin(pos * div)
-        if d > 1:
-            pe[:, 1::2] = torch.cos(pos * div[: (d // 2)])
-        return pe
+        return pe[:t]
 
     def encode(self, x: torch.Tensor) -> torch.Tensor:
         """Return latent sequence: (batch, time, d_model)."""
         h = self.in_proj(x)
         if self.use_positional_encoding:
-            pe = self._sinusoidal_positional_encoding(h.size(1), h.size(2), h.device)
-            h = h + pe.unsqueeze(0)
+            h = h + self._positional_encoding(h.size(1), h.device).unsqueeze(0)
         for block in self.blocks:
             h = block(h)
         return self.norm(h)
@@ -244,7 +487,7 @@ def make_trialwise_dataloaders(
     val_fraction: float = 0.2,
     min_val_trials: int = 50,
     batch_size: int = 32,
-) -> Tuple[DataLoader, Optional[DataLoader]]:
+) -> Tuple[TensorBatchLoader, Optional[TensorBatchLoader]]:
     if x_trials_np.ndim != 3 or y_trials_np.ndim != 3:
         raise ValueError(
             f"Expected 3D arrays, got {x_trials_np.shape} and {y_trials_np.shape}"
@@ -265,8 +508,9 @@ def make_trialwise_dataloaders(
 
     x_train = torch.tensor(x_train_np, dtype=torch.float32)
     y_train = torch.tensor(y_train_np, dtype=torch.float32)
-    train_loader = DataLoader(
-        TensorDataset(x_train, y_train),
+    train_loader = TensorBatchLoader(
+        x_train,
+        y_train,
         batch_size=min(batch_size, len(x_train)),
         shuffle=True,
     )
@@ -275,8 +519,9 @@ def make_trialwise_dataloaders(
     if x_val_np is not None:
         x_val = torch.tensor(x_val_np, dtype=torch.float32)
         y_val = torch.tensor(y_val_np, dtype=torch.float32)
-        val_loader = DataLoader(
-            TensorDataset(x_val, y_val),
+        val_loader = TensorBatchLoader(
+            x_val,
+            y_val,
             batch_size=min(batch_size, len(x_val)),
             shuffle=False,
         )
@@ -284,49 +529,63 @@ def make_trialwise_dataloaders(
 
 
 def pearson_r_flat(y_true: torch.Tensor, y_pred: torch.Tensor) -> float:
-    y_true_np = y_true.detach().reshape(-1).float().cpu().numpy()
-    y_pred_np = y_pred.detach().reshape(-1).float().cpu().numpy()
-    if y_true_np.size < 2 or y_pred_np.size < 2:
-        return float("nan")
-    if np.std(y_true_np) <= 1e-12 or np.std(y_pred_np) <= 1e-12:
-        return float("nan")
-    return float(pearsonr(y_true_np, y_pred_np).statistic)
+    return pearson_r(y_true, y_pred)
 
 
 def _unpack_batch(batch, device):
-    """Unpack a 2- or 3-element batch into (x, z_or_None, y)."""
+    """Unpack a batch into (x, z_or_None, y, trial_index_or_None).
+
+    Handles ``(x, y)``, ``(x, z, y)`` and the unique-trial layout
+    ``(x_unique, trial_index, z_or_None, y)``.
+    """
+    if len(batch) == 4:
+        x, trial_index, z, y = batch
+        z = None if z is None else z.to(device)
+        return x.to(device), z, y.to(device), trial_index.to(device)
     if len(batch) == 3:
         x, z, y = batch
-        return x.to(device), z.to(device), y.to(device)
+        return x.to(device), z.to(device), y.to(device), None
     x, y = batch
-    return x.to(device), None, y.to(device)
+    return x.to(device), None, y.to(device), None
+
+
+def _forward_batch(model, x, z, trial_index):
+    if trial_index is not None:
+        return model(x, z, trial_index=trial_index)
+    if z is not None:
+        return model(x, z)
+    return model(x)
 
 
 def evaluate_attention_model(
-    model: nn.Module, data_loader: DataLoader, device: torch.device
+    model: nn.Module,
+    data_loader: Iterable,
+    device: torch.device,
+    precision: str = "fp32",
 ) -> Dict[str, float]:
     model.eval()
-    losses = []
-    pearsons = []
+    loss_sum = torch.zeros((), device=device)
+    n_batches = 0
+    pearson = StreamingPearson()
     with torch.no_grad():
         for batch in data_loader:
-            x_batch, z_batch, y_batch = _unpack_batch(batch, device)
-            if z_batch is not None:
-                out, _ = model(x_batch, z_batch)
-            else:
-                out, _ = model(x_batch)
-            losses.append(F.mse_loss(out, y_batch).item())
-            pearsons.append(pearson_r_flat(y_batch, out))
+            x_batch, z_batch, y_batch, idx_batch = _unpack_batch(batch, device)
+            with autocast(device, precision):
+                out, _ = _forward_batch(model, x_batch, z_batch, idx_batch)
+            out = out.float()
+            loss_sum += F.mse_loss(out, y_batch)
+            n_batches += 1
+            pearson.update(y_batch, out)
     return {
-        "loss": float(sum(losses) / max(1, len(losses))),
-        "pearson_r": float(sum(pearsons) / max(1, len(pearsons))),
+        "loss": float(loss_sum) / max(1, n_batches),
+        "pearson_r": pearson.result(),
     }
 
 
 def train_attention_regressor(
     model: nn.Module,
-    train_loader: DataLoader,
-    val_loader: Optional[DataLoader] = None,
+    train_loader: Iterable,
+    val_loader: Optional[Iterable] = None,
     epochs: int = 250,
     lr: float = 1e-3,
     weight_decay: float = 0.0,
@@ -334,7 +593,15 @@ def train_attention_regressor(
     patience: Optional[int] = 20,
     print_every: int = 100,
     device: str = "cuda",
+    best_state_path: Optional[Union[str, Path]] = None,
+    precision: str = "fp32",
 ) -> Dict[str, Any]:
+    """Train *model* with AdamW and MSE loss, keeping the best-val-r weights.
+
+    ``precision`` is ``"fp32"``, ``"bf16"`` (CPU autocast) or ``"fp16"``
+    (CUDA autocast with dynamic loss scaling); see ``utils.precision``.
+    """
+    check_precision(precision)
     if device == "mps" and torch.backends.mps.is_available():
         dev = torch.device("mps")
     elif device == "cuda" and torch.cuda.is_available():
@@ -343,6 +610,7 @@ def train_attention_regressor(
         dev = torch.device("cpu")
     model.to(dev)
     optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=weight_decay)
+    scaler = grad_scaler(dev, precision)
 
     hist = {
         "train_loss": [],
@@ -351,38 +619,46 @@ def train_attention_regressor(
         "val_pearson_r": [],
     }
     best_val_pearson = -float("inf")
-    best_state = None
+    best_state = BestStateBuffer(spill_path=best_state_path)
     best_epoch = 0
     bad_epochs = 0
 
     for ep in range(1, epochs + 1):
         model.train()
-        running_loss = 0.0
-        running_pearson = 0.0
+        running_loss = torch.zeros((), device=dev)
+        running_pearson = StreamingPearson()
         n_batches = 0
 
         for batch in train_loader:
-            x_batch, z_batch, y_batch = _unpack_batch(batch, dev)
+            x_batch, z_batch, y_batch, idx_batch = _unpack_batch(batch, dev)
             optimizer.zero_grad()
-            if z_batch is not None:
-                out, _ = model(x_batch, z_batch)
-            else:
-                out, _ = model(x_batch)
+            with autocast(dev, precision):
+                out, _ = _forward_batch(model, x_batch, z_batch, idx_batch)
+            out = out.float()
             loss = F.mse_loss(out, y_batch)
-            loss.backward()
-            nn.utils.clip_grad_norm_(model.parameters(), grad_clip)
-            optimizer.step()
-            running_loss += loss.item()
-            running_pearson += pearson_r_flat(y_batch, out)
+            if scaler is not None:
+                scaler.scale(loss).backward()
+                scaler.unscale_(optimizer)
+                nn.utils.clip_grad_norm_(model.parameters(), grad_clip)
+                scaler.step(optimizer)
+                scaler.update()
+            else:
+                loss.backward()
+                nn.utils.clip_grad_norm_(model.parameters(), grad_clip)
+                optimizer.step()
+            running_loss += loss.detach()
+            running_pearson.update(y_batch, out)
             n_batches += 1
 
-        train_loss = running_loss / max(1, n_batches)
-        train_pearson = running_pearson / max(1, n_batches)
+        train_loss = float(running_loss) / max(1, n_batches)
+        train_pearson = running_pearson.result()
         hist["train_loss"].append(train_loss)
         hist["train_pearson_r"].append(train_pearson)
 
         if val_loader is not None:
-            val_metrics = evaluate_attention_model(model, val_loader, dev)
+            val_metrics = evaluate_attention_model(
+                model, val_loader, dev, precision=precision
+            )
             hist["val_loss"].append(val_metrics["loss"])
             hist["val_pearson_r"].append(val_metrics["pearson_r"])
             if (
@@ -392,7 +668,7 @@ def train_attention_regressor(
                 best_val_pearson = val_metrics["pearson_r"]
                 best_epoch = ep
                 bad_epochs = 0
-                best_state = copy.deepcopy(model.state_dict())
+                best_state.save(model)
             else:
                 bad_epochs += 1
 
@@ -413,8 +689,8 @@ def train_attention_regressor(
             )
             break
 
-    if best_state is not None:
-        model.load_state_dict(best_state)
+    if best_state.has_state:
+        best_state.restore(model)
     return {
         "history": hist,
         "best_val_pearson_r": best_val_pearson,
@@ -451,6 +727,7 @@ class TrialHistoryNeuralAttentionRegressor(nn.Module):
         trial_attn_window: Optional[int] = None,
         trial_use_positional_encoding: bool = True,
         n_trial_features: int = 0,
+        fused_attention: bool = False,
     ):
         super().__init__()
         if trial_context_len < 1:
@@ -471,6 +748,7 @@ class TrialHistoryNeuralAttentionRegressor(nn.Module):
             use_positional_encoding=use_positional_encoding,
             attention_type=attention_type,
             attn_window=attn_window,
+            fused_attention=fused_attention,
         )
 
         if n_trial_features > 0:
@@ -489,6 +767,7 @@ class TrialHistoryNeuralAttentionRegressor(nn.Module):
                     dropout=dropout,
                     attention_type=trial_attention_type,
                     attn_window=trial_attn_window,
+                    fused_attention=fused_attention,
                 )
                 for _ in range(n_layers)
             ]
@@ -496,102 +775,272 @@ class TrialHistoryNeuralAttentionRegressor(nn.Module):
         self.trial_norm = nn.LayerNorm(d_model)
         self.ctx_proj = nn.Linear(d_model, d_model)
         self.out_proj = nn.Linear(d_model, output_dim)
-
-    @staticmethod
-    def _sinusoidal_positional_encoding(
-        t: int, d: int, device: torch.device
-    ) -> torch.Tensor:
-        pos = torch.arange(t, device=device, dtype=torch.float32).unsqueeze(1)
-        div = torch.exp(
-            torch.arange(0, d, 2, device=device, dtype=torch.float32)
-            * (-math.log(10000.0) / d)
+        self.register_buffer(
+            "_trial_pe_cache", torch.empty(0, d_model), persistent=False
         )
-        pe = torch.zeros(t, d, device=device)
-        pe[:, 0::2] = torch.sin(pos * div)
-        if d > 1:
-            pe[:, 1::2] = torch.cos(pos * div[: (d // 2)])
-        return pe
 
-    def forward(self, x: torch.Tensor, z: Optional[torch.Tensor] = None):
+    def forward(
+        self,
+        x: torch.Tensor,
+        z: Optional[torch.Tensor] = None,
+        trial_index: Optional[torch.Tensor] = None,
+    ):
         """
         Parameters
         ----------
         x : (batch, trial_context_len, time, input_dim)
-            Full DMAT for the within-trial encoder.
+            Full DMAT for the within-trial encoder.  With *trial_index*,
+            ``(n_unique, time, input_dim)``: each trial of the batch once.
         z : (batch, trial_context_len, n_trial_features), optional
             Compact per-trial features (choice/outcome/SVD) for the
             cross-trial attention.  When provided and ``n_trial_features > 0``
             the projected features are added to the encoder-derived trial
             tokens so the cross-trial stack can directly read behavioural
             identity from neighbouring trials.
+        trial_index : (batch, trial_context_len) long, optional
+            Row of *x* holding each window position (the layout produced by
+            ``TrialContextDataset(unique_trials=True)``).  Every unique trial
+            is then encoded once and its latents shared by all windows that
+            contain it, instead of encoding ``batch * trial_context_len``
+            trials.
         """
-        if x.ndim != 4:
+        if trial_index is not None:
+            if x.ndim != 3 or trial_index.ndim != 2:
+                raise ValueError(
+                    "With trial_index expected x (n_unique, time, input_dim) and "
+                    f"trial_index (batch, trial_context_len), got {tuple(x.shape)} "
+                    f"and {tuple(trial_index.shape)}"
+                )
+            ctx_len = trial_index.shape[1]
+        elif x.ndim != 4:
             raise ValueError(
                 f"Expected x with shape (batch, trial_context_len, time, input_dim), got {tuple(x.shape)}"
             )
+        else:
+            ctx_len = x.shape[1]
 
-        bsz, ctx_len, n_time, _ = x.shape
         if ctx_len != self.trial_context_len:
             raise ValueError(
                 f"Input trial context length {ctx_len} != model trial_context_len={self.trial_context_len}"
             )
 
-        x_flat = x.reshape(bsz * ctx_len, n_time, x.shape[-1])
-        h_flat = self.within_trial.encode(x_flat)
-        d_model = h_flat.shape[-1]
-        h_ctx = h_flat.reshape(bsz, ctx_len, n_time, d_model)
-
-        trial_tokens = h_ctx.mean(dim=2)
+        if trial_index is not None:
+            h_trials = self.within_trial.encode(x)
+            trial_tokens = h_trials.mean(dim=1)[trial_index]
+            current_h = h_trials[trial_index[:, -1]]
+        else:
+            bsz, _, n_time, _ = x.shape
+            x_flat = x.reshape(bsz * ctx_len, n_time, x.shape[-1])
+            h_flat = self.within_trial.encode(x_flat)
+            d_model = h_flat.shape[-1]
+            h_ctx = h_flat.reshape(bsz, ctx_len, n_time, d_model)
+            trial_tokens = h_ctx.mean(dim=2)
+            current_h = h_ctx[:, -1, :, :]
 
         if z is not None and self.n_trial_features > 0:
             trial_tokens = trial_tokens + self.trial_feature_proj(z)
 
+        return self._decode_context(trial_tokens, current_h)
+
+    def _decode_context(self, trial_tokens: torch.Tensor, current_h: torch.Tensor):
+        """Cross-trial stack and readout.
+
+        *trial_tokens* ``(batch, ctx_len, d_model)`` are the per-trial tokens
+        (encoder mean plus projected trial features) oldest first, and
+        *current_h* ``(batch, time, d_model)`` the latents of the last trial.
+        """
+        ctx_len, d_model = trial_tokens.shape[1:]
         if self.trial_use_positional_encoding:
-            pe_trials = self._sinusoidal_positional_encoding(
-                ctx_len, d_model, trial_tokens.device
-            )
+            pe_trials = _grown_buffer(
+                self,
+                "_trial_pe_cache",
+                ctx_len,
+                trial_tokens.device,
+                torch.float32,
+                lambda n, dev: _sinusoidal_positional_encoding(n, d_model, dev),
+            )[:ctx_len]
             trial_tokens = trial_tokens + pe_trials.unsqueeze(0)
 
         for block in self.trial_blocks:
             trial_tokens = block(trial_tokens)
         trial_tokens = self.trial_norm(trial_tokens)
 
-        current_h = h_ctx[:, -1, :, :]
         ctx_vec = self.ctx_proj(trial_tokens[:, -1, :]).unsqueeze(1)
         fused = current_h + ctx_vec
 
         return self.out_proj(fused), fused
 
 
+class TrialContextStream:
+    """Incremental (online) inference with a trial-context model.
+
+    Feed trials one at a time as they complete; each ``step`` encodes only
+    the new trial with ``within_trial.encode`` and keeps its token (encoder
+    mean plus ``trial_feature_proj`` of its features) in a ring buffer of
+    the last ``trial_context_len`` trials.  The cross-trial stack is then
+    rerun over the buffered tokens, which costs ``trial_context_len``
+    d_model-sized tokens against the ``time``-step encoder, so a step costs
+    about one trial encoding instead of ``trial_context_len``.
+
+    Cross-trial keys / values are deliberately not carried over between
+    steps: positional encodings are relative to the window and the oldest
+    trial drops out each step, so cached values would no longer match the
+    window the model was trained on.  Outputs equal ``model(x, z)`` on the
+    corresponding window.
+
+    Usage:
+        stream = TrialContextStream(model)
+        for x_trial, z_trial in live_trials:
+            result = stream.step(x_trial, z_trial)
+            if result is not None:
+                y_hat, latents = result
+    """
+
+    def __init__(self, model: TrialHistoryNeuralAttentionRegressor):
+        self.model = model.eval()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all buffered trials (e.g. at the start of a session)."""
+        self._tokens = None
+        self._n_seen = 0
+
+    @property
+    def ready(self) -> bool:
+        """True once ``trial_context_len`` trials have been seen."""
+        return self._n_seen >= self.model.trial_context_len
+
+    @torch.no_grad()
+    def step(
+        self, x_trial: torch.Tensor, z_trial: Optional[torch.Tensor] = None
+    ) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+        """Add one trial and decode it.
+
+        Parameters
+        ----------
+        x_trial : (time, input_dim)
+            DMAT of the new trial.
+        z_trial : (n_trial_features,), optional
+            Its per-trial features, as in ``model(x, z)``.
+
+        Returns
+        -------
+        ``(output, latents)`` of shapes ``(time, output_dim)`` and
+        ``(time, d_model)`` for the new trial, or ``None`` while fewer than
+        ``trial_context_len`` trials have been seen (the model is only
+        defined on full windows).
+        """
+        model = self.model
+        ctx_len = model.trial_context_len
+        device = model.out_proj.weight.device
+        h = model.within_trial.encode(x_trial.to(device).unsqueeze(0))
+        token = h.mean(dim=1)
+        if z_trial is not None and model.n_trial_features > 0:
+            token = token + model.trial_feature_proj(z_trial.to(device).unsqueeze(0))
+
+        if self._tokens is None:
+            self._tokens = token.new_empty(ctx_len, token.shape[-1])
+        head = self._n_seen % ctx_len
+        self._tokens[head] = token[0]
+        self._n_seen += 1
+        if not self.ready:
+            return None
+
+        # Oldest trial is at the next write position.
+        tokens = self._tokens.roll(-((head + 1) % ctx_len), dims=0)
+        out, fused = model._decode_context(tokens.unsqueeze(0), h)
+        return out[0], fused[0]
+
+
 # ---------------------------------------------------------------------------
 # Trial-context dataloader helpers
 # ---------------------------------------------------------------------------
 
 
-def _build_trial_context_arrays(
-    x_trials_np: np.ndarray,
-    y_trials_np: np.ndarray,
-    trial_context_len: int,
-    z_trials_np: Optional[np.ndarray] = None,
-) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
-    if trial_context_len < 1:
-        raise ValueError(f"trial_context_len must be >= 1, got {trial_context_len}")
-    n_trials = x_trials_np.shape[0]
-    if n_trials < trial_context_len:
-        raise ValueError(
-            f"Need at least trial_context_len trials: n_trials={n_trials}, "
-            f"trial_context_len={trial_context_len}"
+class TrialContextDataset(Dataset):
+    """Sliding trial-context windows over a single copy of the trial data.
+
+    Sample ``i`` is ``(x[e-L+1 : e+1], y[e])`` (or ``(x, z, y)`` when
+    per-trial features *z* are given) with ``e = ends[i]`` and
+    ``L = trial_context_len``.  Windows are views into the base tensors, so
+    memory stays at one copy of the data whatever ``L`` is; a
+    ``(batch, L, time, features)`` block only exists for the current batch.
+    Train/val splits made with ``subset`` share the same base tensors, and
+    ``batch`` gathers a whole minibatch in one indexing op (used by
+    ``TensorBatchLoader``).
+
+    With ``unique_trials=True`` ``batch`` returns
+    ``(x_unique, trial_index, z_or_None, y)`` instead: every trial the
+    batch's windows touch appears once in ``x_unique`` and
+    ``trial_index[b, j]`` is the row of window ``b``'s ``j``-th trial, for
+    ``TrialHistoryNeuralAttentionRegressor.forward(..., trial_index=...)``.
+    """
+
+    def __init__(
+        self,
+        x_trials: torch.Tensor,
+        y_trials: torch.Tensor,
+        trial_context_len: int,
+        z_trials: Optional[torch.Tensor] = None,
+        ends: Optional[torch.Tensor] = None,
+        unique_trials: bool = False,
+    ):
+        if trial_context_len < 1:
+            raise ValueError(f"trial_context_len must be >= 1, got {trial_context_len}")
+        n_trials = x_trials.shape[0]
+        if n_trials < trial_context_len:
+            raise ValueError(
+                f"Need at least trial_context_len trials: n_trials={n_trials}, "
+                f"trial_context_len={trial_context_len}"
+            )
+        self.x = x_trials
+        self.y = y_trials
+        self.z = z_trials
+        self.trial_context_len = int(trial_context_len)
+        if ends is None:
+            ends = torch.arange(self.trial_context_len - 1, n_trials)
+        self.ends = ends
+        self._offsets = torch.arange(-self.trial_context_len + 1, 1)
+        self.unique_trials = unique_trials
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, i):
+        end = int(self.ends[i]) + 1
+        start = end - self.trial_context_len
+        if self.z is None:
+            return self.x[start:end], self.y[end - 1]
+        return self.x[start:end], self.z[start:end], self.y[end - 1]
+
+    def batch(self, idx: torch.Tensor):
+        """Samples *idx* gathered straight from the base tensors."""
+        ends = self.ends[idx]
+        win = (ends.unsqueeze(1) + self._offsets).reshape(-1)
+        shape = (len(ends), self.trial_context_len)
+        y = self.y.index_select(0, ends)
+        z = None
+        if self.z is not None:
+            z = self.z.index_select(0, win).view(*shape, *self.z.shape[1:])
+        if self.unique_trials:
+            trials, trial_index = torch.unique(win, return_inverse=True)
+            x = self.x.index_select(0, trials)
+            return x, trial_index.view(shape), z, y
+        x = self.x.index_select(0, win).view(*shape, *self.x.shape[1:])
+        if z is None:
+            return x, y
+        return x, z, y
+
+    def subset(self, start: int, stop: int) -> "TrialContextDataset":
+        """Samples ``start:stop`` as a dataset over the same base tensors."""
+        return TrialContextDataset(
+            self.x,
+            self.y,
+            self.trial_context_len,
+            z_trials=self.z,
+            ends=self.ends[start:stop],
+            unique_trials=self.unique_trials,
         )
-    x_ctx, y_cur = [], []
-    z_ctx = [] if z_trials_np is not None else None
-    for end_idx in range(trial_context_len - 1, n_trials):
-        start_idx = end_idx - trial_context_len + 1
-        x_ctx.append(x_trials_np[start_idx : end_idx + 1])
-        y_cur.append(y_trials_np[end_idx])
-        if z_ctx is not None:
-            z_ctx.append(z_trials_np[start_idx : end_idx + 1])
-    z_out = np.stack(z_ctx, axis=0) if z_ctx is not None else None
-    return np.stack(x_ctx, axis=0), np.stack(y_cur, axis=0), z_out
 
 
 def make_trial_context_dataloaders(
@@ -602,11 +1051,19 @@ def make_trial_context_dataloaders(
     min_val_trials: int = 50,
     batch_size: int = 32,
     z_trials_np: Optional[np.ndarray] = None,
-) -> Tuple[DataLoader, Optional[DataLoader]]:
-    """Build train/val DataLoaders for the trial-context model.
+    unique_trials: bool = False,
+) -> Tuple[TensorBatchLoader, Optional[TensorBatchLoader]]:
+    """Build train/val batch loaders for the trial-context model.
 
     When *z_trials_np* is supplied each batch yields ``(x, z, y)``; otherwise
     ``(x, y)`` as before, keeping backward compatibility with the old model.
+
+    ``unique_trials=True`` switches to the ``(x_unique, trial_index, z, y)``
+    layout of ``TrialContextDataset`` so the model encodes each trial once
+    per batch.  Training batches are then runs of consecutive windows
+    (batch order shuffled, not samples), which is what makes trials shared:
+    a batch of B windows touches ``B + trial_context_len - 1`` trials
+    instead of up to ``B * trial_context_len``.
     """
     if x_trials_np.ndim != 3 or y_trials_np.ndim != 3:
         raise ValueError(
@@ -619,14 +1076,17 @@ def make_trial_context_dataloaders(
     if not (0.0 <= val_fraction < 1.0):
         raise ValueError("val_fraction must be in [0,1)")
 
-    x_ctx_np, y_cur_np, z_ctx_np = _build_trial_context_arrays(
-        x_trials_np,
-        y_trials_np,
+    dataset = TrialContextDataset(
+        torch.tensor(x_trials_np, dtype=torch.float32),
+        torch.tensor(y_trials_np, dtype=torch.float32),
         trial_context_len=int(trial_context_len),
-        z_trials_np=z_trials_np,
+        z_trials=None
+        if z_trials_np is None
+        else torch.tensor(z_trials_np, dtype=torch.float32),
+        unique_trials=unique_trials,
     )
 
-    n_samples = x_ctx_np.shape[0]
+    n_samples = len(dataset)
     if n_samples < 2:
         raise ValueError(f"Need >=2 context samples after windowing, got {n_samples}")
 
@@ -634,52 +1094,34 @@ def make_trial_context_dataloaders(
         n_val = max(min_val_trials, int(round(n_samples * val_fraction)))
         n_val = min(max(1, n_val), n_samples - 1)
         train_end = n_samples - n_val
-        x_train_np, y_train_np = x_ctx_np[:train_end], y_cur_np[:train_end]
-        x_val_np, y_val_np = x_ctx_np[train_end:], y_cur_np[train_end:]
-        z_train_np = z_ctx_np[:train_end] if z_ctx_np is not None else None
-        z_val_np = z_ctx_np[train_end:] if z_ctx_np is not None else None
-    else:
-        x_train_np, y_train_np = x_ctx_np, y_cur_np
-        x_val_np, y_val_np = None, None
-        z_train_np, z_val_np = None, None
-
-    x_train = torch.tensor(x_train_np, dtype=torch.float32)
-    y_train = torch.tensor(y_train_np, dtype=torch.float32)
-
-    if z_train_np is not None:
-        z_train = torch.tensor(z_train_np, dtype=torch.float32)
-        train_ds = TensorDataset(x_train, z_train, y_train)
+        train_ds = dataset.subset(0, train_end)
+        val_ds = dataset.subset(train_end, n_samples)
     else:
-        train_ds = TensorDataset(x_train, y_train)
+        train_ds, val_ds = dataset, None
 
-    train_loader = DataLoader(
+    train_loader = TensorBatchLoader(
         train_ds,
-        batch_size=min(batch_size, len(x_train)),
+        batch_size=min(batch_size, len(train_ds)),
         shuffle=True,
+        block_shuffle=unique_trials,
     )
 
     val_loader = None
-    if x_val_np is not None:
-        x_val = torch.tensor(x_val_np, dtype=torch.float32)
-        y_val = torch.tensor(y_val_np, dtype=torch.float32)
-        if z_val_np is not None:
-            z_val = torch.tensor(z_val_np, dtype=torch.float32)
-            val_ds = TensorDataset(x_val, z_val, y_val)
-        else:
-            val_ds = TensorDataset(x_val, y_val)
-        val_loader = DataLoader(
+    if val_ds is not None:
+        val_loader = TensorBatchLoader(
             val_ds,
-            batch_size=min(batch_size, len(x_val)),
+            batch_size=min(batch_size, len(val_ds)),
             shuffle=False,
         )
 
     print(
-        f"context_len={trial_context_len} | train samples={len(x_train)} | "
-        f"val samples={0 if x_val_np is None else len(x_val)} | batch_size={batch_size}"
+        f"context_len={trial_context_len} | train samples={len(train_ds)} | "
+        f"val samples={0 if val_ds is None else len(val_ds)} | batch_size={batch_size}"
         + (
-            f" | trial_features={z_train_np.shape[-1]}"
-            if z_train_np is not None
+            f" | trial_features={z_trials_np.shape[-1]}"
+            if z_trials_np is not None
             else ""
         )
+        + (" | unique_trials" if unique_trials else "")
     )
     return train_loader, val_loader
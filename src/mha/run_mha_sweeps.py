@@ -9,6 +9,7 @@ import argparse
 import itertools
 import json
 import random
+import sys
 import time
 import uuid
 from datetime import datetime
@@ -19,11 +20,15 @@ import numpy as np
 import pandas as pd
 import torch
 
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(REPO_ROOT / "src"))
+
 from mha_model_utils import (
     NeuralAttentionRegressor,
     make_trialwise_dataloaders,
     train_attention_regressor,
 )
+from utils.data import load_dmat_trials
 
 SESSIONS = {
     "early": "20231211_172819",
@@ -133,21 +138,8 @@ def default_dmat_path(repo_root: Path, session: str) -> Path:
 
 def load_dmat_timecourse(session: str, repo_root: Path, bins_per_trial: int = 299):
     p = default_dmat_path(repo_root, session)
-    d = np.load(p)
-    x = d["X"].astype(np.float32)
-    y = d["Y"].astype(np.float32)
-    if x.shape[0] != y.shape[0]:
-        raise ValueError(f"X/Y row mismatch: {x.shape[0]} vs {y.shape[0]}")
-    if x.shape[0] % bins_per_trial != 0:
-        raise ValueError(
-            f"Rows {x.shape[0]} not divisible by bins_per_trial={bins_per_trial}."
-        )
-    n_trials = x.shape[0] // bins_per_trial
-    return (
-        x.reshape(n_trials, bins_per_trial, x.shape[1]),
-        y.reshape(n_trials, bins_per_trial, y.shape[1]),
-        p,
-    )
+    x, y = load_dmat_trials(p, bins_per_trial=bins_per_trial)
+    return x, y, p
 
 
 def run_custom_sweep(configs, run_config_fn, results_csv, static_fields=None):
@@ -241,6 +233,8 @@ def run_session(
     print_every: int,
     val_fraction: float,
     min_val_trials: int,
+    precision: str = "fp32",
+    fused_attention: bool = False,
 ) -> None:
     session = SESSIONS[session_label]
     results_csv = str(results_dir / f"sweep_{session_label}.csv")
@@ -289,6 +283,17 @@ def run_session(
         print("Nothing to run — all configs already completed.")
         return
 
+    # Resolve per-config overrides up front so each row records the
+    # precision/attention settings the run actually used.
+    configs = [
+        {
+            **cfg,
+            "precision": str(cfg.get("precision", precision)),
+            "fused_attention": bool(cfg.get("fused_attention", fused_attention)),
+        }
+        for cfg in configs
+    ]
+
     def run_mha_config(cfg):
         train_loader, val_loader = make_trialwise_dataloaders(
             x_trials,
@@ -310,6 +315,7 @@ def run_session(
             attn_window=None
             if cfg.get("attn_window") is None
             else int(cfg["attn_window"]),
+            fused_attention=bool(cfg["fused_attention"]),
         )
         t0 = time.perf_counter()
         out = train_attention_regressor(
@@ -323,6 +329,7 @@ def run_session(
             patience=int(cfg["patience"]),
             print_every=print_every,
             device=device,
+            precision=str(cfg["precision"]),
         )
         elapsed = time.perf_counter() - t0
         hist = out["history"]
@@ -372,6 +379,17 @@ def main() -> None:
     parser.add_argument("--val-fraction", type=float, default=0.2)
     parser.add_argument("--min-val-trials", type=int, default=50)
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--precision",
+        choices=["fp32", "bf16", "fp16"],
+        default="fp32",
+        help="Training precision; bf16 runs autocast on CPU",
+    )
+    parser.add_argument(
+        "--fused-attention",
+        action="store_true",
+        help="Use the packed-QKV scaled_dot_product_attention path",
+    )
     args = parser.parse_args()
 
     repo_root = Path(args.repo_root).resolve()
@@ -397,6 +415,8 @@ def main() -> None:
             print_every=args.print_every,
             val_fraction=args.val_fraction,
             min_val_trials=args.min_val_trials,
+            precision=args.precision,
+            fused_attention=args.fused_attention,
         )
 
     print("\nALL DONE")
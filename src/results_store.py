@@ -0,0 +1,354 @@
+"""Append-only storage backends for sweep results.
+
+``run_sweep`` writes one row per finished run.  Rewriting the whole results
+file per row is O(N²) over a sweep and can leave a truncated file if the
+process dies mid-write, so rows are appended instead:
+
+- ``.db`` / ``.sqlite`` / ``.sqlite3`` paths use a SQLite table.  New columns
+  are added with ``ALTER TABLE ... ADD COLUMN`` (no rewrite) and each row is
+  inserted in its own transaction, so a killed process never loses earlier
+  rows.
+- Any other path is treated as CSV.  Rows whose columns already exist in the
+  header are appended in place; only a row that introduces new columns
+  triggers a rewrite, done via a temp file and ``os.replace``.
+
+Next to each results file, ``SignatureIndex`` keeps a ``<file>.sigidx`` of
+hashed config signatures so sweep deduplication does not have to re-parse
+the results.
+
+Exports
+-------
+CSVResultsStore      – append-in-place CSV results file
+SQLiteResultsStore   – SQLite results table with schema evolution
+open_results_store   – pick a backend from the file suffix
+read_results         – load one or more result files into a DataFrame
+canonical_value      – config value as it compares after a results round trip
+config_digest        – stable hash of a config restricted to given keys
+SignatureIndex       – persistent set of config digests for a results file
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import math
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+import numpy as np
+import pandas as pd
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+PathLike = Union[str, Path]
+
+
+class CSVResultsStore:
+    """CSV results file that appends rows without re-reading the file."""
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+
+    def _header(self) -> List[str]:
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return []
+        with open(self.path, newline="") as f:
+            return next(csv.reader(f), [])
+
+    def append(self, row: Dict[str, Any]) -> None:
+        row_df = pd.DataFrame([row])
+        header = self._header()
+        if not header:
+            row_df.to_csv(self.path, index=False)
+            return
+        if set(row_df.columns) <= set(header):
+            row_df.reindex(columns=header).to_csv(
+                self.path, mode="a", header=False, index=False
+            )
+            return
+        # New columns: rewrite once, atomically, so older rows gain them.
+        existing = pd.read_csv(self.path, on_bad_lines="skip")
+        merged = pd.concat([existing, row_df], ignore_index=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        merged.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+    def read(self) -> pd.DataFrame:
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return pd.DataFrame()
+        return pd.read_csv(self.path, on_bad_lines="skip")
+
+    def count_rows(self, where: Optional[Dict[str, Any]] = None) -> int:
+        """Number of rows whose columns equal *where* (all rows if ``None``)."""
+        header = self._header()
+        if not header:
+            return 0
+        where = where or {}
+        if any(k not in header for k in where):
+            return 0
+        df = pd.read_csv(
+            self.path,
+            usecols=list(where) or [header[0]],
+            dtype=str,
+            keep_default_na=False,
+            on_bad_lines="skip",
+        )
+        mask = np.ones(len(df), dtype=bool)
+        for k, v in where.items():
+            mask &= (df[k] == str(v)).to_numpy()
+        return int(mask.sum())
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_value(v: Any) -> Any:
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    if isinstance(v, (list, tuple, dict)):
+        return json.dumps(v)
+    if isinstance(v, Path):
+        return str(v)
+    return v
+
+
+class SQLiteResultsStore:
+    """SQLite results table whose columns grow as new config keys appear."""
+
+    table = "runs"
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=60.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (run_id TEXT)")
+        return conn
+
+    def append(self, row: Dict[str, Any]) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                existing = {
+                    r[1] for r in conn.execute(f"PRAGMA table_info({self.table})")
+                }
+                for col in row:
+                    if col not in existing:
+                        conn.execute(
+                            f"ALTER TABLE {self.table} ADD COLUMN {_quote_ident(col)}"
+                        )
+                cols = ", ".join(_quote_ident(c) for c in row)
+                marks = ", ".join("?" for _ in row)
+                conn.execute(
+                    f"INSERT INTO {self.table} ({cols}) VALUES ({marks})",
+                    [_sql_value(v) for v in row.values()],
+                )
+        finally:
+            conn.close()
+
+    def read(self) -> pd.DataFrame:
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return pd.DataFrame()
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(f"SELECT * FROM {self.table} ORDER BY rowid", conn)
+        finally:
+            conn.close()
+
+    def count_rows(self, where: Optional[Dict[str, Any]] = None) -> int:
+        """Number of rows whose columns equal *where* (all rows if ``None``)."""
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return 0
+        where = where or {}
+        conn = self._connect()
+        try:
+            existing = {r[1] for r in conn.execute(f"PRAGMA table_info({self.table})")}
+            if any(k not in existing for k in where):
+                return 0
+            sql = f"SELECT COUNT(*) FROM {self.table}"
+            if where:
+                sql += " WHERE " + " AND ".join(f"{_quote_ident(k)} = ?" for k in where)
+            return conn.execute(
+                sql, [_sql_value(v) for v in where.values()]
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+
+def open_results_store(path: PathLike) -> Union[CSVResultsStore, SQLiteResultsStore]:
+    """Return the results backend matching *path*'s suffix."""
+    if Path(path).suffix.lower() in SQLITE_SUFFIXES:
+        return SQLiteResultsStore(path)
+    return CSVResultsStore(path)
+
+
+def read_results(paths: Union[PathLike, Sequence[PathLike]]) -> pd.DataFrame:
+    """Load one or more results files (CSV or SQLite) into a single DataFrame.
+
+    Missing, empty or unreadable files are skipped, so the result may be an
+    empty DataFrame.
+    """
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    frames = []
+    for p in paths:
+        if p is None:
+            continue
+        try:
+            df = open_results_store(p).read()
+        except (
+            OSError,
+            UnicodeDecodeError,
+            sqlite3.Error,
+            pd.errors.DatabaseError,
+            pd.errors.ParserError,
+        ) as e:
+            print(f"Skipping unreadable results file {p}: {e}")
+            continue
+        if not df.empty:
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+# ---------------------------------------------------------------------------
+# Config signature index
+# ---------------------------------------------------------------------------
+
+
+def canonical_value(v: Any) -> Any:
+    """Map a config value to the form it takes after any results round trip.
+
+    CSV and SQLite turn ``None`` into NaN, bools into 0/1 and ints in
+    NaN-holding columns into floats, so all of those are folded together.
+    """
+    if isinstance(v, np.generic):
+        v = v.item()
+    if v is None:
+        return None
+    if isinstance(v, bool):
+        return int(v)
+    if isinstance(v, float):
+        if math.isnan(v):
+            return None
+        if v.is_integer():
+            return int(v)
+    return v
+
+
+def config_digest(cfg: Dict[str, Any], keys: Sequence[str]) -> str:
+    """Hash of ``cfg`` restricted to *keys* (missing keys count as ``None``)."""
+    payload = json.dumps(
+        [[k, canonical_value(cfg.get(k))] for k in keys],
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=12).hexdigest()
+
+
+class SignatureIndex:
+    """Persistent set of ``config_digest`` values for one results file.
+
+    Stored as ``<results file>.sigidx`` with one ``<keyset> <digest>`` line
+    per run, so one index can serve several signature key sets.  Loading
+    reads only the index file plus a row count.  This key set's lines are
+    rebuilt from the results file when the results file was modified after
+    the index (e.g. rows written by an older version), or when there are
+    fewer of them than result rows matching *where* (e.g.
+    ``{"model_type": ..., "task_type": ...}``; all rows if ``None``).
+    Rebuilding rewrites only this key set's lines.
+    """
+
+    def __init__(
+        self,
+        results_path: PathLike,
+        keys: Sequence[str],
+        where: Optional[Dict[str, Any]] = None,
+    ):
+        self.results_path = Path(results_path)
+        self.path = self.results_path.with_name(self.results_path.name + ".sigidx")
+        self.keys = tuple(keys)
+        self.where = dict(where or {})
+        self.keyset = hashlib.blake2b(
+            json.dumps(self.keys).encode(), digest_size=4
+        ).hexdigest()
+        self.digests: Set[str] = set()
+        self._load()
+
+    def _read_lines(self) -> List[str]:
+        if not self.path.exists():
+            return []
+        with open(self.path) as f:
+            return f.readlines()
+
+    def _load(self) -> None:
+        if not self.results_path.exists() or self.results_path.stat().st_size == 0:
+            if self.path.exists():
+                self.path.unlink()
+            return
+        stale = (
+            not self.path.exists()
+            or self.path.stat().st_mtime_ns < self.results_path.stat().st_mtime_ns
+        )
+        if not stale:
+            prefix = self.keyset + " "
+            own = [
+                line[len(prefix) :].strip()
+                for line in self._read_lines()
+                if line.startswith(prefix)
+            ]
+            self.digests = set(own)
+            # One line per covered row, so a shortfall means rows are missing.
+            n_rows = open_results_store(self.results_path).count_rows(self.where)
+            stale = len(own) < n_rows
+        if stale:
+            self.rebuild()
+
+    def rebuild(self) -> None:
+        """Recompute this key set's digests from the results file."""
+        df = read_results(self.results_path)
+        for k, v in self.where.items():
+            if k not in df.columns:
+                df = df.iloc[:0]
+                break
+            df = df[df[k].map(canonical_value) == canonical_value(v)]
+        cols = [k for k in self.keys if k in df.columns]
+        if df.empty or not cols:
+            row_digests = []
+        else:
+            values = df.reindex(columns=list(self.keys)).to_numpy(dtype=object)
+            row_digests = [
+                config_digest(dict(zip(self.keys, row)), self.keys) for row in values
+            ]
+        self.digests = set(row_digests)
+        prefix = self.keyset + " "
+        others = [line for line in self._read_lines() if not line.startswith(prefix)]
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.writelines(others)
+            f.writelines(f"{prefix}{d}\n" for d in row_digests)
+        os.replace(tmp_path, self.path)
+
+    def digest(self, cfg: Dict[str, Any]) -> str:
+        return config_digest(cfg, self.keys)
+
+    def add(self, cfgs: Iterable[Dict[str, Any]]) -> None:
+        """Record configs that were just written to the results file."""
+        new = [self.digest(c) for c in cfgs]
+        with open(self.path, "a") as f:
+            f.writelines(f"{self.keyset} {d}\n" for d in new)
+        self.digests.update(new)
+
+    def __contains__(self, cfg: Dict[str, Any]) -> bool:
+        return self.digest(cfg) in self.digests
+
+    def __len__(self) -> int:
+        return len(self.digests)
@@ -5,6 +5,8 @@ Exports
 TaskConfig                  – dataclass for task hyperparameters
 TwoArmedBanditBlockTask     – synthetic block-alternation task
 sample_training_batch       – sample a batch of synthetic sessions
+SessionBank                 – pre-generated session pool with epoch sampling
+BatchPrefetcher             – background-thread batch preparation queue
 moving_average              – sliding-window average
 VanillaRateRNN              – choice-prediction RNN (tanh, cross-entropy)
 VanillaRateRNNNeural        – neural-activity-prediction RNN (relu, MSE)
@@ -19,6 +21,8 @@ create_neural_targets_from_psth – build per-trial neural targets from PSTHs
 align_behavior_and_neural   – trim behavior and neural arrays to the same length
 run_closed_loop_session_for_plot – closed-loop rollout for vanilla RNN
 run_closed_loop_lstm        – closed-loop rollout for LSTM models
+run_closed_loop_batch       – lockstep closed-loop rollout of many sessions
+session_at                  – pick one session out of a batched rollout
 plot_block_choice_panel     – choice scatter + smoothed average per block
 plot_pright_animal_vs_model – compare animal vs model P(right) over blocks
 compute_unit_r2                 – per-unit R² averaged over trials (NaN-safe)
@@ -28,19 +32,26 @@ visualize_neural_predictions    – heatmap + trial-averaged prediction diagnost
 
 from __future__ import annotations
 
-import copy
+import json
 import math
+import queue
+import threading
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 import matplotlib.pyplot as plt
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import torch.utils.checkpoint
 from matplotlib.lines import Line2D
-from scipy.stats import pearsonr
+
+from utils.checkpoint import BestStateBuffer
+from utils.metrics import StreamingPearson, pearson_r
+from utils.precision import autocast, check_precision, grad_scaler
 
 
 # ─── Task ────────────────────────────────────────────────────────────────────
@@ -141,6 +152,81 @@ class TwoArmedBanditBlockTask:
             "blocks": blocks,
         }
 
+    def _block_schedule_batch(self, rng: np.random.Generator, batch_size: int):
+        """Draw block schedules for *batch_size* sessions at once.
+
+        Enough blocks are drawn to cover ``total_trials`` even if every block
+        has ``min_block_len`` trials; blocks starting past the session end are
+        simply never used, so the per-block distribution matches
+        ``_generate_blocks``.
+
+        Returns
+        -------
+        targets, block_ids, trial_in_block : int arrays of shape [B, T]
+        blocks : one ``[(high_side, block_len), ...]`` list per session
+        """
+        B, T = int(batch_size), self.cfg.total_trials
+        n_blocks = -(-T // max(1, self.cfg.min_block_len))
+        block_lens = rng.integers(
+            self.cfg.min_block_len, self.cfg.max_block_len + 1, size=(B, n_blocks)
+        )
+        block_starts = np.cumsum(block_lens, axis=1) - block_lens
+
+        t_idx = np.arange(T)
+        block_ids = (block_starts[:, None, :] <= t_idx[None, :, None]).sum(axis=2) - 1
+        targets = (self.start_side + block_ids) % 2
+        trial_in_block = t_idx - np.take_along_axis(block_starts, block_ids, axis=1)
+
+        blocks = [
+            [((self.start_side + k) % 2, int(block_lens[b, k])) for k in range(n)]
+            for b, n in enumerate(block_ids[:, -1] + 1)
+        ]
+        return targets, block_ids, trial_in_block, blocks
+
+    def rollout_batch(
+        self,
+        rng: np.random.Generator,
+        batch_size: int,
+        device: Optional[torch.device] = None,
+    ) -> dict:
+        """Create *batch_size* random-policy sessions with array ops.
+
+        Statistically identical to calling ``rollout(rng, policy_fn=None)``
+        once per session, but the RNG stream is consumed in a different
+        order, so individual sessions differ for the same seed.
+
+        Returns
+        -------
+        dict with ``inputs`` [B, T, 4], ``targets``, ``actions``,
+        ``rewards``, ``block_ids`` [B, T] and ``blocks`` (one
+        ``[(high_side, block_len), ...]`` list per session).  If *device* is
+        given, the array entries are returned as tensors on that device.
+        """
+        B, T = int(batch_size), self.cfg.total_trials
+        targets, block_ids, trial_in_block, blocks = self._block_schedule_batch(rng, B)
+
+        actions = rng.integers(0, 2, size=(B, T))
+        reward_prob = np.where(actions == targets, self.cfg.p_high, self.cfg.p_low)
+        rewards = (rng.random((B, T)) < reward_prob).astype(np.float32)
+
+        X = np.zeros((B, T, 4), dtype=np.float32)
+        X[:, 1:, 0] = actions[:, :-1] == self.LEFT
+        X[:, 1:, 1] = actions[:, :-1] == self.RIGHT
+        X[:, 1:, 2] = rewards[:, :-1]
+        X[:, :, 3] = trial_in_block == 0
+
+        session = {
+            "inputs": X,
+            "targets": targets.astype(np.int64),
+            "actions": actions.astype(np.int64),
+            "rewards": rewards,
+            "block_ids": block_ids.astype(np.int64),
+        }
+        if device is not None:
+            session = {k: torch.from_numpy(v).to(device) for k, v in session.items()}
+        session["blocks"] = blocks
+        return session
+
 
 # Helpers
 
@@ -150,15 +236,30 @@ def sample_training_batch(
     batch_size: int = 64,
     seed: Optional[int] = None,
     device: Optional[torch.device] = None,
+    vectorized: bool = False,
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     """Sample a batch of synthetic sessions from *task*.
 
+    By default sessions come from the per-session ``rollout`` loop, so a
+    given *seed* reproduces the same batch as before.  ``vectorized=True``
+    generates the whole batch with ``TwoArmedBanditBlockTask.rollout_batch``
+    instead: much faster, but it consumes the RNG differently, so seeded
+    batches differ from the loop's.
+
     Returns
     -------
     X : FloatTensor of shape [batch_size, T, 4]
     y : LongTensor  of shape [batch_size, T]
     """
     rng = np.random.default_rng(seed)
+    if vectorized:
+        session = task.rollout_batch(
+            rng,
+            batch_size=batch_size,
+            device=torch.device("cpu") if device is None else device,
+        )
+        return session["inputs"], session["targets"]
+
     X_batch, y_batch = [], []
     for _ in range(batch_size):
         session = task.rollout(rng=rng, policy_fn=None)
@@ -170,6 +271,258 @@ def sample_training_batch(
     return X, y
 
 
+class SessionBank:
+    """Fixed pool of synthetic sessions sampled as shuffled minibatches.
+
+    Sessions are generated once with ``TwoArmedBanditBlockTask.rollout_batch``
+    and stored as contiguous ``inputs`` [N, T, 4] / ``targets`` [N, T] arrays.
+    ``next_batch`` walks a random permutation of the pool without replacement;
+    each full pass is one epoch.  With ``refresh_every=k`` (and a task
+    attached) the pool is regenerated after every k epochs.
+
+    Banks can be written to disk with ``save`` and reopened with ``load``
+    (memory-mapped by default), so several sweep runs can share one curriculum.
+    """
+
+    def __init__(
+        self,
+        inputs: np.ndarray,
+        targets: np.ndarray,
+        task: Optional[TwoArmedBanditBlockTask] = None,
+        refresh_every: Optional[int] = None,
+        seed: Optional[int] = None,
+    ):
+        if inputs.shape[:2] != targets.shape[:2]:
+            raise ValueError(
+                f"inputs/targets mismatch: {inputs.shape} vs {targets.shape}"
+            )
+        self.inputs = inputs
+        self.targets = targets
+        self.task = task
+        self.refresh_every = refresh_every
+        self.epoch = 0
+        self._rng = np.random.default_rng(seed)
+        self._order = self._rng.permutation(len(self))
+        self._pos = 0
+
+    @classmethod
+    def generate(
+        cls,
+        task: TwoArmedBanditBlockTask,
+        n_sessions: int,
+        seed: Optional[int] = None,
+        refresh_every: Optional[int] = None,
+    ) -> "SessionBank":
+        """Generate *n_sessions* random-policy sessions in one vectorized pass."""
+        session = task.rollout_batch(np.random.default_rng(seed), n_sessions)
+        return cls(
+            session["inputs"],
+            session["targets"],
+            task=task,
+            refresh_every=refresh_every,
+            seed=None if seed is None else seed + 1,
+        )
+
+    def save(self, path) -> None:
+        """Write the bank to directory *path* as uncompressed ``.npy`` files."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "inputs.npy", np.ascontiguousarray(self.inputs))
+        np.save(path / "targets.npy", np.ascontiguousarray(self.targets))
+        meta = {"n_sessions": len(self)}
+        if self.task is not None:
+            meta["task_config"] = asdict(self.task.cfg)
+            meta["start_side"] = self.task.start_side
+        with open(path / "meta.json", "w") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(
+        cls,
+        path,
+        mmap: bool = True,
+        seed: Optional[int] = None,
+        refresh_every: Optional[int] = None,
+    ) -> "SessionBank":
+        """Open a bank written by ``save``.
+
+        With ``mmap=True`` the arrays stay on disk (``mmap_mode='r'``) and only
+        the sampled rows are read.  The task config stored alongside is
+        restored, so ``refresh_every`` works for loaded banks too.
+        """
+        path = Path(path)
+        mode = "r" if mmap else None
+        inputs = np.load(path / "inputs.npy", mmap_mode=mode)
+        targets = np.load(path / "targets.npy", mmap_mode=mode)
+        task = None
+        meta_path = path / "meta.json"
+        if meta_path.exists():
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if "task_config" in meta:
+                task = TwoArmedBanditBlockTask(
+                    TaskConfig(**meta["task_config"]),
+                    start_side=int(meta.get("start_side", 0)),
+                )
+        return cls(inputs, targets, task=task, refresh_every=refresh_every, seed=seed)
+
+    def __len__(self) -> int:
+        return int(self.inputs.shape[0])
+
+    def _start_epoch(self) -> None:
+        self.epoch += 1
+        if (
+            self.refresh_every is not None
+            and self.task is not None
+            and self.epoch % self.refresh_every == 0
+        ):
+            session = self.task.rollout_batch(self._rng, len(self))
+            self.inputs, self.targets = session["inputs"], session["targets"]
+        self._order = self._rng.permutation(len(self))
+        self._pos = 0
+
+    def next_batch(
+        self,
+        batch_size: int,
+        device: Optional[torch.device] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Return the next ``(X, y)`` minibatch, starting a new epoch when needed.
+
+        Batches never straddle epochs, so the last batch of an epoch may be
+        smaller than *batch_size*.
+        """
+        if self._pos >= len(self):
+            self._start_epoch()
+        idx = np.sort(self._order[self._pos : self._pos + batch_size])
+        self._pos += len(idx)
+        X = torch.from_numpy(np.ascontiguousarray(self.inputs[idx]))
+        y = torch.from_numpy(np.ascontiguousarray(self.targets[idx]))
+        return X.to(device=device, dtype=torch.float32), y.to(
+            device=device, dtype=torch.long
+        )
+
+
+class BatchPrefetcher:
+    """Prepare training batches on a background thread.
+
+    Consumes *batches* (an iterable of tensor tuples) on a worker thread and
+    keeps up to *depth* ready batches in a bounded queue, so batch preparation
+    overlaps with the caller's forward/backward pass.  When *device* is a CUDA
+    device, CPU tensors are copied from pinned memory with
+    ``non_blocking=True``.
+
+    Counters for checking the overlap:
+
+    - ``stall_sec`` / ``n_stalls`` – time the consumer waited on an empty
+      queue, and how often that happened
+    - ``queue_depth`` – current number of ready batches
+    - ``stats()`` – summary dict, including the mean depth seen at each fetch
+
+    Exceptions raised while preparing a batch are re-raised in the consumer.
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        batches: Iterable,
+        depth: int = 2,
+        device: Optional[torch.device] = None,
+    ):
+        self.depth = max(1, int(depth))
+        self.device = None if device is None else torch.device(device)
+        self._pin = self.device is not None and self.device.type == "cuda"
+        self._queue: queue.Queue = queue.Queue(maxsize=self.depth)
+        self._stop = threading.Event()
+        self.n_batches = 0
+        self.n_stalls = 0
+        self.stall_sec = 0.0
+        self._depth_sum = 0
+        self._n_fetches = 0
+        self._thread = threading.Thread(
+            target=self._worker, args=(iter(batches),), daemon=True
+        )
+        self._thread.start()
+
+    def _transfer(self, t):
+        if not isinstance(t, torch.Tensor) or self.device is None:
+            return t
+        if self._pin and t.device.type == "cpu":
+            t = t.pin_memory()
+        return t.to(self.device, non_blocking=self._pin)
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker(self, it) -> None:
+        try:
+            for batch in it:
+                if self._stop.is_set():
+                    return
+                if not self._put(tuple(self._transfer(t) for t in batch)):
+                    return
+        except BaseException as e:  # re-raised in the consumer thread
+            self._put(e)
+            return
+        self._put(self._DONE)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        depth = self._queue.qsize()
+        self._depth_sum += depth
+        self._n_fetches += 1
+        t0 = time.perf_counter()
+        item = self._queue.get()
+        if depth == 0:
+            self.n_stalls += 1
+            self.stall_sec += time.perf_counter() - t0
+        if item is self._DONE:
+            self._stop.set()
+            raise StopIteration
+        if isinstance(item, BaseException):
+            self._stop.set()
+            raise item
+        self.n_batches += 1
+        return item
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "depth": self.depth,
+            "n_batches": self.n_batches,
+            "n_stalls": self.n_stalls,
+            "stall_sec": round(self.stall_sec, 4),
+            "mean_queue_depth": self._depth_sum / max(1, self._n_fetches),
+        }
+
+    def close(self) -> None:
+        """Stop the worker and drop any batches still queued."""
+        self._stop.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join(timeout=1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
 def moving_average(x, k: int = 25) -> np.ndarray:
     """Sliding-window average with window size *k*."""
     if len(x) < k:
@@ -198,8 +551,164 @@ def _set_lstm_forget_bias(lstm: nn.LSTM, forget_bias_init: float) -> None:
                 param[hidden : 2 * hidden].fill_(0.0)
 
 
+def _rate_rnn_scan(
+    drive: torch.Tensor,
+    h: torch.Tensor,
+    w_rec: torch.Tensor,
+    b_rec: torch.Tensor,
+    alpha: float,
+    use_relu: bool,
+) -> torch.Tensor:
+    """Integrate the rate-RNN recurrence over a precomputed input drive.
+
+    ``drive`` holds ``W_in·x`` for every time step ([B, T, hidden_size]), so
+    the loop body is a single recurrent matmul.  Pure tensor function with
+    typed arguments, so it can be wrapped by ``torch.jit.script`` or
+    ``torch.compile`` unchanged.
+
+    With autograd enabled the states are collected via ``unbind``/``stack``:
+    slicing ``drive`` per step or writing into a shared buffer makes the
+    backward pass quadratic in T.  Under ``no_grad`` they are written into a
+    preallocated buffer instead.
+
+    Returns
+    -------
+    h_hist : [B, T, hidden_size]
+    """
+    if torch.is_grad_enabled():
+        h_list: List[torch.Tensor] = []
+        for d_t in drive.unbind(1):
+            r = torch.relu(h) if use_relu else torch.tanh(h)
+            h = h + alpha * (-h + (d_t + F.linear(r, w_rec) + b_rec))
+            h_list.append(h)
+        return torch.stack(h_list, dim=1)
+
+    h_hist = torch.empty_like(drive)
+    for t in range(drive.size(1)):
+        r = torch.relu(h) if use_relu else torch.tanh(h)
+        h = h + alpha * (-h + (drive[:, t] + F.linear(r, w_rec) + b_rec))
+        h_hist[:, t] = h
+    return h_hist
+
+
+def _rate_rnn_segment(
+    x: torch.Tensor,
+    h: torch.Tensor,
+    w_in: torch.Tensor,
+    w_rec: torch.Tensor,
+    b_rec: torch.Tensor,
+    w_out: torch.Tensor,
+    b_out: torch.Tensor,
+    alpha: float,
+    use_relu: bool,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Fused rate-RNN forward (input projection, scan, readout) over *x*."""
+    h_hist = _rate_rnn_scan(F.linear(x, w_in), h, w_rec, b_rec, alpha, use_relu)
+    r_hist = torch.relu(h_hist) if use_relu else torch.tanh(h_hist)
+    return F.linear(r_hist, w_out, b_out), h_hist
+
+
+def _checkpointed_rate_rnn(
+    x: torch.Tensor,
+    h: torch.Tensor,
+    w_in: torch.Tensor,
+    w_rec: torch.Tensor,
+    b_rec: torch.Tensor,
+    w_out: torch.Tensor,
+    b_out: torch.Tensor,
+    alpha: float,
+    use_relu: bool,
+    segment: int,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Fused rate-RNN forward with activation checkpointing every *segment* steps.
+
+    Each segment (input projection, recurrence and readout) runs under
+    ``torch.utils.checkpoint``, so autograd keeps only the inputs, the
+    state at segment boundaries and the returned outputs/states.  The input
+    drive, per-step activations and readout activations are recomputed one
+    segment at a time during backward, i.e. one extra forward pass in total.
+
+    Returns
+    -------
+    out    : [B, T, output_size]
+    h_hist : [B, T, hidden_size]
+    """
+    out_segs: List[torch.Tensor] = []
+    h_segs: List[torch.Tensor] = []
+    # split (not per-segment slicing) keeps the input gradient a single cat.
+    for x_seg in x.split(segment, dim=1):
+        out_seg, h_seg = torch.utils.checkpoint.checkpoint(
+            _rate_rnn_segment,
+            x_seg,
+            h,
+            w_in,
+            w_rec,
+            b_rec,
+            w_out,
+            b_out,
+            alpha,
+            use_relu,
+            use_reentrant=False,
+        )
+        # clone: a view would keep the whole segment buffer alive as the
+        # next segment's checkpointed input, on top of the concatenated copy.
+        h = h_seg[:, -1].clone()
+        out_segs.append(out_seg)
+        h_segs.append(h_seg)
+    return torch.cat(out_segs, dim=1), torch.cat(h_segs, dim=1)
+
+
+def _rate_rnn_step(
+    x_t: torch.Tensor,
+    h: torch.Tensor,
+    w_in: torch.Tensor,
+    w_rec: torch.Tensor,
+    b_rec: torch.Tensor,
+    w_out: torch.Tensor,
+    b_out: torch.Tensor,
+    alpha: float,
+    use_relu: bool,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Advance the rate-RNN recurrence by one step.
+
+    Under ``no_grad`` the state ``h`` is updated in place and the activation
+    buffer is reused for the readout, so a step allocates only the
+    pre-activation and the output.  With autograd enabled it falls back to
+    out-of-place ops and leaves ``h`` untouched.
+
+    Returns
+    -------
+    out_t : [B, output_size]
+    h     : [B, hidden_size]
+    """
+    act = torch.relu if use_relu else torch.tanh
+    if torch.is_grad_enabled():
+        pre = F.linear(x_t, w_in) + F.linear(act(h), w_rec) + b_rec
+        h = h + alpha * (-h + pre)
+        return F.linear(act(h), w_out, b_out), h
+
+    r = act(h)
+    pre = torch.addmm(b_rec, r, w_rec.t()).addmm_(x_t, w_in.t())
+    h.mul_(1.0 - alpha).add_(pre, alpha=alpha)
+    r.copy_(h)
+    r = r.relu_() if use_relu else r.tanh_()
+    return torch.addmm(b_out, r, w_out.t()), h
+
+
 class VanillaRateRNN(nn.Module):
-    """Vanilla rate RNN."""
+    """Vanilla rate RNN.
+
+    ``fused=True`` switches ``forward`` to the optimized path: the input
+    projection is one batched matmul hoisted out of the time loop, the loop
+    runs through ``_rate_rnn_scan``, and the readout is applied once to the
+    stacked states.  Results match the reference loop to float32 round-off.
+
+    ``checkpoint_segment=k`` (implies the fused path) checkpoints the forward
+    pass every k steps: training keeps the outputs and state history but
+    not the input drive or the per-step activations, which are recomputed
+    during backward.  See
+    ``scripts/bench_rate_rnn_checkpoint.py`` for the memory/speed trade-off.
+    """
 
     def __init__(
         self,
@@ -209,12 +718,20 @@ class VanillaRateRNN(nn.Module):
         dt: float = 1.0,
         tau: float = 10.0,
         g: float = 1.2,
+        fused: bool = False,
+        checkpoint_segment: Optional[int] = None,
     ):
         super().__init__()
+        if checkpoint_segment is not None and checkpoint_segment < 1:
+            raise ValueError(
+                f"checkpoint_segment must be positive, got {checkpoint_segment}"
+            )
         self.input_size = input_size
         self.hidden_size = hidden_size
         self.output_size = output_size
         self.alpha = dt / tau
+        self.fused = fused
+        self.checkpoint_segment = checkpoint_segment
 
         self.w_in = nn.Parameter(
             torch.randn(hidden_size, input_size) / math.sqrt(input_size)
@@ -243,6 +760,27 @@ class VanillaRateRNN(nn.Module):
         B, T, _ = x.shape
         h = torch.zeros(B, self.hidden_size, device=x.device) if h0 is None else h0
 
+        if self.checkpoint_segment is not None and torch.is_grad_enabled():
+            return _checkpointed_rate_rnn(
+                x,
+                h,
+                self.w_in,
+                self.w_rec,
+                self.b_rec,
+                self.w_out,
+                self.b_out,
+                self.alpha,
+                use_relu=False,
+                segment=self.checkpoint_segment,
+            )
+
+        if self.fused or self.checkpoint_segment is not None:
+            drive = F.linear(x, self.w_in)
+            h_hist = _rate_rnn_scan(
+                drive, h, self.w_rec, self.b_rec, self.alpha, use_relu=False
+            )
+            return F.linear(torch.tanh(h_hist), self.w_out, self.b_out), h_hist
+
         logits_hist, h_hist = [], []
         for t in range(T):
             u_t = x[:, t, :]
@@ -257,9 +795,41 @@ class VanillaRateRNN(nn.Module):
 
         return torch.stack(logits_hist, dim=1), torch.stack(h_hist, dim=1)
 
+    def step(self, x_t: torch.Tensor, state: Optional[torch.Tensor] = None):
+        """Advance one time step without building any history.
+
+        Parameters
+        ----------
+        x_t   : [B, input_size]
+        state : [B, hidden_size] or None (zeros).  Updated in place when
+                autograd is disabled.
+
+        Returns
+        -------
+        logits : [B, output_size]
+        state  : [B, hidden_size]
+        """
+        if state is None:
+            state = x_t.new_zeros(x_t.shape[0], self.hidden_size)
+        return _rate_rnn_step(
+            x_t,
+            state,
+            self.w_in,
+            self.w_rec,
+            self.b_rec,
+            self.w_out,
+            self.b_out,
+            self.alpha,
+            use_relu=False,
+        )
+
 
 class VanillaRateRNNNeural(nn.Module):
-    """Same recurrent setup as VanillaRateRNN but with ReLU and continuous neural outputs."""
+    """Same recurrent setup as VanillaRateRNN but with ReLU and continuous neural outputs.
+
+    Supports the same ``fused`` and ``checkpoint_segment`` options as
+    ``VanillaRateRNN``.
+    """
 
     def __init__(
         self,
@@ -269,12 +839,20 @@ class VanillaRateRNNNeural(nn.Module):
         dt: float = 1.0,
         tau: float = 10.0,
         g: float = 1.2,
+        fused: bool = False,
+        checkpoint_segment: Optional[int] = None,
     ):
         super().__init__()
+        if checkpoint_segment is not None and checkpoint_segment < 1:
+            raise ValueError(
+                f"checkpoint_segment must be positive, got {checkpoint_segment}"
+            )
         self.input_size = input_size
         self.hidden_size = hidden_size
         self.output_size = output_size
         self.alpha = dt / tau
+        self.fused = fused
+        self.checkpoint_segment = checkpoint_segment
 
         self.w_in = nn.Parameter(
             torch.randn(hidden_size, input_size) / math.sqrt(input_size)
@@ -303,6 +881,27 @@ class VanillaRateRNNNeural(nn.Module):
         B, T, _ = x.shape
         h = torch.zeros(B, self.hidden_size, device=x.device) if h0 is None else h0
 
+        if self.checkpoint_segment is not None and torch.is_grad_enabled():
+            return _checkpointed_rate_rnn(
+                x,
+                h,
+                self.w_in,
+                self.w_rec,
+                self.b_rec,
+                self.w_out,
+                self.b_out,
+                self.alpha,
+                use_relu=True,
+                segment=self.checkpoint_segment,
+            )
+
+        if self.fused or self.checkpoint_segment is not None:
+            drive = F.linear(x, self.w_in)
+            h_hist = _rate_rnn_scan(
+                drive, h, self.w_rec, self.b_rec, self.alpha, use_relu=True
+            )
+            return F.linear(torch.relu(h_hist), self.w_out, self.b_out), h_hist
+
         y_hist, h_hist = [], []
         for t in range(T):
             u_t = x[:, t, :]
@@ -317,6 +916,34 @@ class VanillaRateRNNNeural(nn.Module):
 
         return torch.stack(y_hist, dim=1), torch.stack(h_hist, dim=1)
 
+    def step(self, x_t: torch.Tensor, state: Optional[torch.Tensor] = None):
+        """Advance one time step without building any history.
+
+        Parameters
+        ----------
+        x_t   : [B, input_size]
+        state : [B, hidden_size] or None (zeros).  Updated in place when
+                autograd is disabled.
+
+        Returns
+        -------
+        y_hat  : [B, output_size]
+        state  : [B, hidden_size]
+        """
+        if state is None:
+            state = x_t.new_zeros(x_t.shape[0], self.hidden_size)
+        return _rate_rnn_step(
+            x_t,
+            state,
+            self.w_in,
+            self.w_rec,
+            self.b_rec,
+            self.w_out,
+            self.b_out,
+            self.alpha,
+            use_relu=True,
+        )
+
 
 class LSTMBehavior(nn.Module):
     """LSTM for trial-by-trial choice prediction (left=0 / right=1).
@@ -370,6 +997,22 @@ class LSTMBehavior(nn.Module):
         logits = self.fc(out)
         return logits, state
 
+    def step(self, x_t: torch.Tensor, state=None):
+        """Advance one time step (online / closed-loop inference).
+
+        Parameters
+        ----------
+        x_t   : [B, input_size]
+        state : (h, c) tuple, each [num_layers, B, hidden_size], or None
+
+        Returns
+        -------
+        logits : [B, output_size]
+        state  : (h, c) after this step
+        """
+        out, state = self.lstm(x_t.unsqueeze(1), state)
+        return self.fc(out[:, 0]), state
+
 
 class LSTMNeural(nn.Module):
     """LSTM for continuous neural-activity prediction (MSE loss).
@@ -428,6 +1071,22 @@ class LSTMNeural(nn.Module):
         y_hat = self.fc(self.out_drop(out))
         return y_hat, state
 
+    def step(self, x_t: torch.Tensor, state=None):
+        """Advance one time step (online / closed-loop inference).
+
+        Parameters
+        ----------
+        x_t   : [B, input_size]
+        state : (h, c) tuple, each [num_layers, B, hidden_size], or None
+
+        Returns
+        -------
+        y_hat  : [B, output_size]
+        state  : (h, c) after this step
+        """
+        out, state = self.lstm(x_t.unsqueeze(1), state)
+        return self.fc(self.out_drop(out[:, 0])), state
+
 
 # Training
 
@@ -457,32 +1116,62 @@ def train_model(
     grad_clip: float = 1.0,
     print_every: int = 100,
     device: Optional[torch.device] = None,
+    session_bank: Optional[SessionBank] = None,
+    prefetch: int = 0,
 ):
-    """Train *model* on batches of simulated sessions from *task*."""
+    """Train *model* on batches of simulated sessions from *task*.
+
+    By default every step samples fresh sessions.  Pass *session_bank* to
+    draw minibatches from a pre-generated ``SessionBank`` instead.  With
+    ``prefetch=K > 0`` the next K batches are prepared on a background
+    thread (see ``BatchPrefetcher``) and its counters are printed at the end.
+    """
     _check_not_already_trained(model, "train_model")
     model.train()
     opt = torch.optim.AdamW(model.parameters(), lr=lr, betas=(0.95, 0.999))
 
     loss_hist, acc_hist = [], []
 
-    for step in range(1, steps + 1):
-        X, y = sample_training_batch(task, batch_size=batch_size, device=device)
-        logits, _ = model(X)
+    # With prefetching, batches are built on the CPU and moved by the worker.
+    batch_device = None if prefetch > 0 else device
 
-        loss = F.cross_entropy(logits.reshape(-1, 2), y.reshape(-1))
-        opt.zero_grad()
-        loss.backward()
-        nn.utils.clip_grad_norm_(model.parameters(), grad_clip)
-        opt.step()
+    def _batches():
+        for _ in range(steps):
+            if session_bank is not None:
+                yield session_bank.next_batch(batch_size, device=batch_device)
+            else:
+                # Unseeded, so the faster (differently ordered) sampler is safe.
+                yield sample_training_batch(
+                    task, batch_size=batch_size, device=batch_device, vectorized=True
+                )
 
-        with torch.no_grad():
-            acc = (logits.argmax(dim=-1) == y).float().mean().item()
+    batches = (
+        BatchPrefetcher(_batches(), depth=prefetch, device=device)
+        if prefetch > 0
+        else _batches()
+    )
+    try:
+        for step, (X, y) in enumerate(batches, 1):
+            logits, _ = model(X)
 
-        loss_hist.append(loss.item())
-        acc_hist.append(acc)
+            loss = F.cross_entropy(logits.reshape(-1, 2), y.reshape(-1))
+            opt.zero_grad()
+            loss.backward()
+            nn.utils.clip_grad_norm_(model.parameters(), grad_clip)
+            opt.step()
+
+            with torch.no_grad():
+                acc = (logits.argmax(dim=-1) == y).float().mean().item()
 
-        if step % print_every == 0:
-            print(f"step {step:4d} | loss {loss.item():.4f} | acc {acc:.3f}")
+            loss_hist.append(loss.item())
+            acc_hist.append(acc)
+
+            if step % print_every == 0:
+                print(f"step {step:4d} | loss {loss.item():.4f} | acc {acc:.3f}")
+    finally:
+        if isinstance(batches, BatchPrefetcher):
+            batches.close()
+            print(f"prefetch: {batches.stats()}")
 
     setattr(model, _RNN_UTILS_TRAINED_FLAG, True)
     return loss_hist, acc_hist
@@ -612,15 +1301,69 @@ def _build_scheduler(
     raise ValueError(f"Unknown scheduler: {scheduler_name}")
 
 
+def _carry_state(hidden_states):
+    """Detached final state to start the next truncated-BPTT window from.
+
+    The LSTMs return their final ``(h, c)``; the rate RNNs return the
+    state history ``[B, T, H]``, whose last step is the state to carry.
+    """
+    if isinstance(hidden_states, tuple):
+        return tuple(s.detach() for s in hidden_states)
+    return hidden_states[:, -1].detach()
+
+
 def _pearson_r_metric(y_true: torch.Tensor, y_pred: torch.Tensor) -> float:
-    """Compute Pearson correlation on flattened tensors."""
-    y_true_np = y_true.detach().reshape(-1).float().cpu().numpy()
-    y_pred_np = y_pred.detach().reshape(-1).float().cpu().numpy()
-    if y_true_np.size < 2 or y_pred_np.size < 2:
-        return float("nan")
-    if np.std(y_true_np) <= 1e-12 or np.std(y_pred_np) <= 1e-12:
-        return float("nan")
-    return float(pearsonr(y_true_np, y_pred_np).statistic)
+    """Compute Pearson correlation on flattened tensors (on their device)."""
+    return pearson_r(y_true, y_pred)
+
+
+def _evaluate_outputs(
+    model: nn.Module, X: torch.Tensor, Y: torch.Tensor, task_type: str
+) -> Tuple[torch.Tensor, float]:
+    """Prediction loss and metric (accuracy or Pearson r) of *model* on (X, Y)."""
+    output, _ = model(X)
+    output = output.float()
+    if task_type == "behavior":
+        loss = F.cross_entropy(output.reshape(-1, 2), Y.reshape(-1))
+        metric = (output.argmax(dim=-1) == Y).float().mean().item()
+    else:
+        loss = F.mse_loss(output, Y)
+        metric = _pearson_r_metric(Y, output)
+    return loss, metric
+
+
+class _MinibatchStats:
+    """Training loss/metric accumulated on device over one epoch's minibatches."""
+
+    def __init__(self, task_type: str):
+        self.task_type = task_type
+        self.loss_sum = None
+        self.n_elems = 0
+        self.n_correct = None
+        self.pearson = StreamingPearson()
+
+    @torch.no_grad()
+    def update(self, pred_loss: torch.Tensor, output: torch.Tensor, y: torch.Tensor):
+        # Losses are means over elements; weight by batch size to pool them.
+        n = y.numel()
+        loss = pred_loss.detach() * n
+        self.loss_sum = loss if self.loss_sum is None else self.loss_sum + loss
+        self.n_elems += n
+        if self.task_type == "behavior":
+            correct = (output.argmax(dim=-1) == y).sum()
+            self.n_correct = (
+                correct if self.n_correct is None else self.n_correct + correct
+            )
+        else:
+            self.pearson.update(y, output)
+
+    def result(self) -> Tuple[torch.Tensor, float]:
+        if self.loss_sum is None:
+            return torch.tensor(float("nan")), float("nan")
+        loss = self.loss_sum / self.n_elems
+        if self.task_type == "behavior":
+            return loss, float(self.n_correct) / self.n_elems
+        return loss, self.pearson.result()
 
 
 @torch.no_grad()
@@ -629,22 +1372,16 @@ def check_r2(model: nn.Module, data_loader, chunk_size: int = 100) -> float:
     del chunk_size  # Reserved for API compatibility.
     model.eval()
 
-    y_eval = []
-    y_pred = []
+    acc = StreamingPearson()
     device = next(model.parameters()).device
 
     for x_batch, y_batch in data_loader:
         x_batch = x_batch.to(device)
         y_batch = y_batch.to(device)
         out, _ = model(x_batch, None)
-        y_eval.append(y_batch.cpu())
-        y_pred.append(out.cpu())
+        acc.update(y_batch, out)
 
-    if not y_eval or not y_pred:
-        return float("nan")
-    y_eval_cat = torch.cat(y_eval, dim=0)
-    y_pred_cat = torch.cat(y_pred, dim=0)
-    return _pearson_r_metric(y_eval_cat, y_pred_cat)
+    return acc.result()
 
 
 def run_training(
@@ -668,6 +1405,13 @@ def run_training(
     normalize_inputs: bool = False,
     print_every: int = 200,
     device: Optional[torch.device] = None,
+    prefetch: int = 0,
+    eval_every: int = 1,
+    train_eval: str = "full",
+    eval_subsample: int = 256,
+    best_state_path: Optional[Union[str, Path]] = None,
+    precision: str = "fp32",
+    tbptt: Optional[int] = None,
 ) -> Dict[str, Any]:
     """Unified training loop for sweep-compatible model training.
 
@@ -710,13 +1454,59 @@ def run_training(
         How often to print progress.
     device : torch.device or None
         Device override.
+    prefetch : int
+        If > 0, minibatch slicing, input noise and the host-to-device copy
+        run on a background thread that keeps this many batches ready
+        (see ``BatchPrefetcher``).  Input noise then comes from a dedicated
+        generator, so noise draws differ from the ``prefetch=0`` path.
+    eval_every : int
+        Evaluate (and record histories, select the best state, check early
+        stopping) only every this many epochs; the last epoch is always
+        evaluated.  ``patience`` still counts epochs.  A ``"plateau"``
+        scheduler only steps on evaluated epochs.
+    train_eval : str
+        How the training-set loss/metric are obtained on evaluated epochs:
+        ``"full"`` (extra forward pass over all of ``X_seq``),
+        ``"minibatch"`` (running statistics of the minibatch pass, in train
+        mode, at no extra cost) or ``"subsample"`` (forward pass over a fixed
+        random subset of ``eval_subsample`` sequences).  Validation is always
+        evaluated on the full ``X_val``.
+    eval_subsample : int
+        Subset size for ``train_eval="subsample"``.
+    best_state_path : str, Path or None
+        The best weights are kept in a preallocated shadow buffer that is
+        overwritten in place on each improvement.  If a path is given they
+        are instead written there by a background thread, so the snapshot
+        does not stay resident next to the model (see ``BestStateBuffer``).
+    precision : str
+        ``"fp32"`` (default), ``"bf16"`` or ``"fp16"``.  The lower
+        precisions run forward passes (training and evaluation) under
+        ``torch.autocast``; weights, optimizer state and losses stay
+        float32.  ``"bf16"`` is the CPU mode.  ``"fp16"`` (CUDA only) adds
+        dynamic loss scaling via ``torch.amp.GradScaler``.
+    tbptt : int or None
+        Truncated backpropagation through time.  Each minibatch is split
+        along time into windows of this many bins, with one optimizer step
+        per window.  The final recurrent state of a window (``h`` for the
+        rate RNNs, ``(h, c)`` for the LSTMs) is detached and fed to the next
+        one, so activation memory depends on the window, not on ``T``.
+        ``None`` backpropagates through full sequences.  Evaluation always
+        runs on full sequences.
 
     Returns
     -------
     dict with keys:
         loss_hist, metric_hist, best_metric, best_epoch, final_metric, final_loss, elapsed_sec
-        plus train/val histories and metric source metadata.
+        plus train/val histories and metric source metadata, and
+        ``eval_epochs`` (the epoch of each history entry).  With
+        ``prefetch > 0`` also ``prefetch_stats`` (batches, stalls, stall time).
     """
+    if train_eval not in ("full", "minibatch", "subsample"):
+        raise ValueError(f"Unknown train_eval: {train_eval}")
+    check_precision(precision)
+    if tbptt is not None and tbptt < 1:
+        raise ValueError(f"tbptt must be a positive window length, got {tbptt}")
+    eval_every = max(1, int(eval_every))
     clear_training_state(model)
     model.train()
 
@@ -737,8 +1527,8 @@ def run_training(
     has_val = X_val is not None and Y_val is not None
     best_metric = float("-inf")
     best_epoch = 0
-    best_state_dict = None
-    epochs_without_improvement = 0
+    best_state = BestStateBuffer(spill_path=best_state_path)
+    eval_epochs: List[int] = []
 
     t0 = time.time()
 
@@ -748,9 +1538,23 @@ def run_training(
     else:
         chunk_size = int(batch_size)
 
-    for ep in range(1, epochs + 1):
-        model.train()
-        order = torch.randperm(n_sequences, device=X_seq.device)
+    X_train_eval, Y_train_eval = X_seq, Y_seq
+    if train_eval == "subsample" and eval_subsample < n_sequences:
+        sub_idx = torch.randperm(n_sequences, device=X_seq.device)[:eval_subsample]
+        sub_idx = sub_idx.sort().values
+        X_train_eval, Y_train_eval = X_seq[sub_idx], Y_seq[sub_idx]
+
+    train_device = device if device is not None else next(model.parameters()).device
+    # The prefetch worker must not share the global RNG with the training
+    # thread (dropout etc.), otherwise noise draws become order-dependent.
+    noise_gen = None
+    if prefetch > 0 and input_noise_std > 0.0:
+        noise_gen = torch.Generator(device=X_seq.device)
+        noise_gen.manual_seed(int(torch.randint(0, 2**62, (1,)).item()))
+    prefetch_stats = {"n_batches": 0, "n_stalls": 0, "stall_sec": 0.0}
+    scaler = grad_scaler(train_device, precision)
+
+    def _epoch_batches(order: torch.Tensor):
         for start in range(0, n_sequences, chunk_size):
             stop = min(start + chunk_size, n_sequences)
             idx = order[start:stop]
@@ -758,55 +1562,94 @@ def run_training(
             y_batch = Y_seq[idx, :, ...]
 
             if input_noise_std > 0.0:
-                x_batch = x_batch + torch.randn_like(x_batch) * input_noise_std
-
-            output_batch, hidden_states = model(x_batch)
-            if task_type == "behavior":
-                pred_loss = F.cross_entropy(
-                    output_batch.reshape(-1, 2), y_batch.reshape(-1)
+                noise = torch.randn(
+                    x_batch.shape,
+                    generator=noise_gen,
+                    device=x_batch.device,
+                    dtype=x_batch.dtype,
                 )
-            else:
-                pred_loss = F.mse_loss(output_batch, y_batch)
-
-            loss = pred_loss
-            if activity_reg > 0.0 and hidden_states is not None:
-                loss = loss + activity_reg * torch.mean(hidden_states**2)
+                x_batch = x_batch + noise * input_noise_std
+            yield x_batch, y_batch
 
-            optimizer.zero_grad()
-            loss.backward()
-            if gradient_noise_std > 0.0:
-                for p in model.parameters():
-                    if p.grad is not None:
-                        p.grad.add_(torch.randn_like(p.grad) * gradient_noise_std)
-            nn.utils.clip_grad_norm_(model.parameters(), grad_clip)
-            optimizer.step()
+    for ep in range(1, epochs + 1):
+        evaluate = ep % eval_every == 0 or ep == epochs
+        stats = _MinibatchStats(task_type) if train_eval == "minibatch" else None
+        model.train()
+        order = torch.randperm(n_sequences, device=X_seq.device)
+        batches = _epoch_batches(order)
+        if prefetch > 0:
+            batches = BatchPrefetcher(batches, depth=prefetch, device=train_device)
+        try:
+            for x_batch, y_batch in batches:
+                seq_len = int(x_batch.shape[1])
+                window = seq_len if tbptt is None else tbptt
+                state = None
+                for w0 in range(0, seq_len, window):
+                    x_w = x_batch[:, w0 : w0 + window]
+                    y_w = y_batch[:, w0 : w0 + window]
+                    with autocast(train_device, precision):
+                        output_w, hidden_states = model(x_w, state)
+                    output_w = output_w.float()
+                    if task_type == "behavior":
+                        pred_loss = F.cross_entropy(
+                            output_w.reshape(-1, 2), y_w.reshape(-1)
+                        )
+                    else:
+                        pred_loss = F.mse_loss(output_w, y_w)
+
+                    loss = pred_loss
+                    if activity_reg > 0.0 and hidden_states is not None:
+                        loss = loss + activity_reg * torch.mean(
+                            hidden_states.float() ** 2
+                        )
+
+                    optimizer.zero_grad()
+                    if scaler is not None:
+                        scaler.scale(loss).backward()
+                        scaler.unscale_(optimizer)
+                    else:
+                        loss.backward()
+                    if gradient_noise_std > 0.0:
+                        for p in model.parameters():
+                            if p.grad is not None:
+                                p.grad.add_(
+                                    torch.randn_like(p.grad) * gradient_noise_std
+                                )
+                    nn.utils.clip_grad_norm_(model.parameters(), grad_clip)
+                    if scaler is not None:
+                        scaler.step(optimizer)
+                        scaler.update()
+                    else:
+                        optimizer.step()
+                    if stats is not None and evaluate:
+                        stats.update(pred_loss, output_w, y_w)
+                    if w0 + window < seq_len:
+                        state = _carry_state(hidden_states)
+        finally:
+            if isinstance(batches, BatchPrefetcher):
+                batches.close()
+                for k in prefetch_stats:
+                    prefetch_stats[k] += batches.stats()[k]
+
+        if not evaluate:
+            if scheduler is not None and not isinstance(
+                scheduler, torch.optim.lr_scheduler.ReduceLROnPlateau
+            ):
+                scheduler.step()
+            continue
 
         model.eval()
-        with torch.no_grad():
-            output_train, _ = model(X_seq)
-            if task_type == "behavior":
-                train_pred_loss = F.cross_entropy(
-                    output_train.reshape(-1, 2), Y_seq.reshape(-1)
-                )
-                train_metric = (
-                    (output_train.argmax(dim=-1) == Y_seq).float().mean().item()
-                )
+        with torch.no_grad(), autocast(train_device, precision):
+            if stats is not None:
+                train_pred_loss, train_metric = stats.result()
             else:
-                train_pred_loss = F.mse_loss(output_train, Y_seq)
-                train_metric = _pearson_r_metric(Y_seq, output_train)
-
+                train_pred_loss, train_metric = _evaluate_outputs(
+                    model, X_train_eval, Y_train_eval, task_type
+                )
             if has_val:
-                output_val, _ = model(X_val)
-                if task_type == "behavior":
-                    val_pred_loss = F.cross_entropy(
-                        output_val.reshape(-1, 2), Y_val.reshape(-1)
-                    )
-                    val_metric = (
-                        (output_val.argmax(dim=-1) == Y_val).float().mean().item()
-                    )
-                else:
-                    val_pred_loss = F.mse_loss(output_val, Y_val)
-                    val_metric = _pearson_r_metric(Y_val, output_val)
+                val_pred_loss, val_metric = _evaluate_outputs(
+                    model, X_val, Y_val, task_type
+                )
             else:
                 val_pred_loss = None
                 val_metric = None
@@ -822,6 +1665,7 @@ def run_training(
             else:
                 scheduler.step()
 
+        eval_epochs.append(ep)
         train_loss_hist.append(float(train_pred_loss.item()))
         train_metric_hist.append(float(train_metric))
         if has_val:
@@ -833,10 +1677,7 @@ def run_training(
         if not math.isnan(metric_for_selection) and metric_for_selection > best_metric:
             best_metric = metric_for_selection
             best_epoch = ep
-            best_state_dict = copy.deepcopy(model.state_dict())
-            epochs_without_improvement = 0
-        else:
-            epochs_without_improvement += 1
+            best_state.save(model)
 
         if ep % print_every == 0:
             metric_name = "acc" if task_type == "behavior" else "pearson_r"
@@ -850,15 +1691,15 @@ def run_training(
                     f"epoch {ep:4d} | train_loss {train_pred_loss.item():.6f} | train_{metric_name} {train_metric:.4f}"
                 )
 
-        if patience is not None and epochs_without_improvement >= patience:
+        if patience is not None and ep - best_epoch >= patience:
             print(
                 f"Early stopping at epoch {ep} (no improvement for {patience} epochs)"
             )
             break
 
     elapsed = time.time() - t0
-    if best_state_dict is not None:
-        model.load_state_dict(best_state_dict)
+    if best_state.has_state:
+        best_state.restore(model)
     setattr(model, _RNN_UTILS_TRAINED_FLAG, True)
     primary_loss_hist = val_loss_hist if has_val else train_loss_hist
     primary_metric_hist = val_metric_hist if has_val else train_metric_hist
@@ -890,6 +1731,9 @@ def run_training(
         else float("nan"),
         "final_val_loss": float(val_loss_hist[-1]) if val_loss_hist else float("nan"),
         "elapsed_sec": round(elapsed, 2),
+        "eval_epochs": eval_epochs,
+        "precision": precision,
+        **({"prefetch_stats": prefetch_stats} if prefetch > 0 else {}),
     }
 
 
@@ -1125,15 +1969,14 @@ def run_closed_loop_session_for_plot(
                 [prev_left, prev_right, prev_reward, trial_start],
                 dtype=torch.float32,
                 device=device,
-            ).view(1, 1, -1)
+            ).view(1, -1)
 
-            logits, h_hist = model(x_t, h0=h)
-            h = h_hist[:, -1, :]
+            logits, h = model.step(x_t, h)
 
             if rng.random() < epsilon:
                 action = int(rng.integers(0, 2))
             else:
-                probs = torch.softmax(logits[0, -1] / temperature, dim=0).cpu().numpy()
+                probs = torch.softmax(logits[0] / temperature, dim=0).cpu().numpy()
                 action = int(rng.choice([0, 1], p=probs))
 
             actions[t] = action
@@ -1203,15 +2046,14 @@ def run_closed_loop_lstm(
                 [prev_left, prev_right, prev_reward, trial_start],
                 dtype=torch.float32,
                 device=device,
-            ).view(1, 1, -1)
+            ).view(1, -1)
 
-            logits, state = model(x_t, state)
-            state = tuple(s.detach() for s in state)
+            logits, state = model.step(x_t, state)
 
             if rng.random() < epsilon:
                 action = int(rng.integers(0, 2))
             else:
-                probs = torch.softmax(logits[0, -1] / temperature, dim=0).cpu().numpy()
+                probs = torch.softmax(logits[0] / temperature, dim=0).cpu().numpy()
                 action = int(rng.choice([0, 1], p=probs))
 
             actions[t] = action
@@ -1234,6 +2076,78 @@ def run_closed_loop_lstm(
     }
 
 
+@torch.no_grad()
+def run_closed_loop_batch(
+    model: nn.Module,
+    task: TwoArmedBanditBlockTask,
+    n_sessions: int = 100,
+    seed: int = 123,
+    temperature: float = 1.0,
+    epsilon: float = 0.02,
+    device: Optional[torch.device] = None,
+) -> dict:
+    """Closed-loop rollout of *n_sessions* independent sessions in lockstep.
+
+    Works for ``VanillaRateRNN`` and ``LSTMBehavior``.  Each session has its
+    own block schedule; every trial is one recurrent step for the whole
+    batch, and epsilon-greedy / softmax action sampling happens on *device*.
+    Block schedules come from ``np.random.default_rng(seed)`` and action
+    draws from a torch generator seeded with *seed*, so results are
+    reproducible but do not match the single-session functions seed-by-seed.
+
+    Returns
+    -------
+    The ``run_closed_loop_session_for_plot`` dict with every array stacked
+    along a leading session axis ([n_sessions, T]); ``blocks`` is a list with
+    one block list per session.  ``session_at(out, i)`` extracts session *i*
+    for ``plot_block_choice_panel``.
+    """
+    model.eval()
+    if device is None:
+        device = next(model.parameters()).device
+    B, T = int(n_sessions), task.cfg.total_trials
+
+    rng = np.random.default_rng(seed)
+    targets, block_ids, trial_in_block, blocks = task._block_schedule_batch(rng, B)
+    gen = torch.Generator(device=device)
+    gen.manual_seed(seed)
+
+    targets_t = torch.from_numpy(targets).to(device)
+    trial_start_t = torch.from_numpy(trial_in_block == 0).to(device, torch.float32)
+    actions_t = torch.zeros(B, T, dtype=torch.long, device=device)
+    x_t = torch.zeros(B, 4, device=device)
+    state = None
+
+    for t in range(T):
+        x_t[:, 3] = trial_start_t[:, t]
+        logits, state = model.step(x_t, state)
+
+        p_right = torch.softmax(logits / temperature, dim=-1)[:, 1]
+        u = torch.rand(2, B, generator=gen, device=device)
+        explore = torch.rand(B, generator=gen, device=device) < epsilon
+        action = torch.where(explore, u[0] < 0.5, u[1] < p_right).long()
+        actions_t[:, t] = action
+
+        x_t[:, 0] = (action == 0).float()
+        x_t[:, 1] = (action == 1).float()
+        x_t[:, 2] = (action == targets_t[:, t]).float()
+
+    actions = actions_t.cpu().numpy()
+    return {
+        "actions": actions,
+        "targets": targets.astype(np.int64),
+        "rewards": (actions == targets).astype(np.float32),
+        "block_ids": block_ids.astype(np.int64),
+        "trial_in_block": trial_in_block.astype(np.int64),
+        "blocks": blocks,
+    }
+
+
+def session_at(sessions: dict, i: int) -> dict:
+    """Select session *i* from a ``run_closed_loop_batch`` result."""
+    return {k: v[i] for k, v in sessions.items()}
+
+
 # Plotting helpers
 
 
@@ -1525,10 +2439,10 @@ def plot_pright_animal_vs_model(
 
 
 def compute_unit_r2(
-    y_true: np.ndarray,
-    y_pred: np.ndarray,
+    y_true: Union[np.ndarray, torch.Tensor],
+    y_pred: Union[np.ndarray, torch.Tensor],
     min_variance: float = 1e-6,
-) -> np.ndarray:
+) -> Union[np.ndarray, torch.Tensor]:
     """Compute per-unit R² averaged across trials.
 
     Parameters
@@ -1543,22 +2457,35 @@ def compute_unit_r2(
     Returns
     -------
     r2_per_unit : (n_units,) float array, NaN where undefined.
+        If both inputs are torch tensors the computation stays on their
+        device (in their dtype) and a tensor is returned; otherwise NumPy
+        float64 is used.
     """
-    n_trials, n_units, n_bins = y_true.shape
-    r2_per_unit = np.full(n_units, np.nan)
-
-    for u in range(n_units):
-        r2_trials = []
-        for tr in range(n_trials):
-            y_t = y_true[tr, u, :]
-            y_p = y_pred[tr, u, :]
-            ss_res = np.sum((y_t - y_p) ** 2)
-            ss_tot = np.sum((y_t - np.mean(y_t)) ** 2)
-            if ss_tot >= min_variance:
-                r2_trials.append(1.0 - ss_res / ss_tot)
-        if r2_trials:
-            r2_per_unit[u] = float(np.mean(r2_trials))
+    if isinstance(y_true, torch.Tensor) and isinstance(y_pred, torch.Tensor):
+        ss_res = (y_true - y_pred).square().sum(dim=-1)
+        ss_tot = (y_true - y_true.mean(dim=-1, keepdim=True)).square().sum(dim=-1)
+        # NaN variance compares False, so NaN trials are excluded as well.
+        valid = ss_tot >= min_variance
+        r2 = torch.where(valid, 1.0 - ss_res / ss_tot, torch.zeros_like(ss_res))
+        n_valid = valid.sum(dim=0)
+        return torch.where(
+            n_valid > 0,
+            r2.sum(dim=0) / n_valid.clamp(min=1),
+            torch.full_like(r2[0], float("nan")),
+        )
 
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    ss_res = np.sum((y_true - y_pred) ** 2, axis=-1)
+    ss_tot = np.sum((y_true - y_true.mean(axis=-1, keepdims=True)) ** 2, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        valid = ss_tot >= min_variance
+        r2 = np.where(valid, 1.0 - ss_res / np.where(valid, ss_tot, 1.0), 0.0)
+        n_valid = valid.sum(axis=0)
+        r2_sum = r2.sum(axis=0)
+    r2_per_unit = np.full(y_true.shape[1], np.nan)
+    has_valid = n_valid > 0
+    r2_per_unit[has_valid] = r2_sum[has_valid] / n_valid[has_valid]
     return r2_per_unit
 
 
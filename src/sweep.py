@@ -1,24 +1,32 @@
 """Hyperparameter sweep engine for RNN model selection.
 
 Provides utilities for generating search configs, running sweeps across
-model architectures and task types, and logging results to CSV.
+model architectures and task types, and logging results to CSV or SQLite
+(see ``results_store``).
 """
 
 from __future__ import annotations
 
-import itertools
 import json
-import random
+import math
 import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 import numpy as np
 import pandas as pd
 import torch
 import torch.nn as nn
 
+from results_store import (
+    SignatureIndex,
+    canonical_value,
+    config_digest,
+    open_results_store,
+    read_results,
+)
 from rnn_utils import (
     VanillaRateRNN,
     VanillaRateRNNNeural,
@@ -82,84 +90,159 @@ LSTM_ADDON_GRID = {
 }
 
 
-def _dict_product(grid: Dict[str, list]) -> List[Dict[str, Any]]:
-    """Cartesian product of all values in *grid*."""
-    keys = list(grid.keys())
-    values = list(grid.values())
-    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+# Grids up to this many points are walked exactly (as index chunks); larger
+# ones fall back to rejection sampling / a uniform candidate pool.
+_EXACT_GRID_LIMIT = 1 << 24
+_INDEX_CHUNK = 1 << 16
 
 
-def _filter_lstm_dropout(configs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Remove LSTM configs where dropout > 0 but num_layers == 1."""
-    return [
-        c
-        for c in configs
-        if not (c.get("num_layers", 2) == 1 and c.get("dropout", 0.0) > 0.0)
-    ]
+class _GridSpace:
+    """Mixed-radix index space over a Cartesian hyperparameter grid.
 
+    Integer ``i`` maps to one digit per key (the last key varies fastest, as
+    in ``itertools.product``), so configs are only built for indices that
+    are actually drawn.  *filters* are vectorised predicates
+    ``f(space, digits) -> bool mask`` applied lazily to index chunks.
+    """
 
-def _normalize_value(v: Any) -> Any:
-    if isinstance(v, float) and np.isnan(v):
-        return None
-    if isinstance(v, np.generic):
-        return v.item()
-    return v
+    def __init__(self, grid: Dict[str, list], filters: Sequence = ()):
+        self.keys = list(grid.keys())
+        self.values = [list(v) for v in grid.values()]
+        self.radices = tuple(len(v) for v in self.values)
+        self.size = math.prod(self.radices)
+        self.filters = list(filters)
+        # Object arrays so fancy indexing hands back the original values.
+        self._objects = []
+        for vals in self.values:
+            arr = np.empty(len(vals), dtype=object)
+            for i, v in enumerate(vals):
+                arr[i] = v
+            self._objects.append(arr)
+
+    def digits(self, idx: np.ndarray) -> np.ndarray:
+        """[n] flat indices -> [n, n_keys] value positions."""
+        if not self.keys:
+            return np.zeros((len(idx), 0), dtype=np.int64)
+        return np.stack(np.unravel_index(idx, self.radices), axis=1)
+
+    def column(self, digits: np.ndarray, key: str, default: Any) -> np.ndarray:
+        """Values of *key* for each row of *digits* (``default`` if absent)."""
+        if key not in self.keys:
+            return np.full(len(digits), default)
+        j = self.keys.index(key)
+        return np.asarray(self.values[j])[digits[:, j]]
+
+    def valid(self, idx: np.ndarray) -> np.ndarray:
+        mask = np.ones(len(idx), dtype=bool)
+        if self.filters:
+            digits = self.digits(idx)
+            for f in self.filters:
+                mask &= f(self, digits)
+        return mask
+
+    def configs(self, idx: np.ndarray) -> Iterator[Dict[str, Any]]:
+        digits = self.digits(idx)
+        cols = [arr[digits[:, j]].tolist() for j, arr in enumerate(self._objects)]
+        for combo in zip(*cols):
+            yield dict(zip(self.keys, combo))
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        """All valid indices, in grid order."""
+        for start in range(0, self.size, _INDEX_CHUNK):
+            idx = np.arange(start, min(start + _INDEX_CHUNK, self.size))
+            yield idx[self.valid(idx)]
+
+    def shuffled_chunks(
+        self, rng: np.random.Generator, max_draws: int
+    ) -> Iterator[np.ndarray]:
+        """Distinct valid indices in uniformly random order.
+
+        Exact (a permutation) when the grid is no larger than *max_draws* (or
+        one index chunk), so the permutation costs no more than the draws;
+        otherwise rejection sampling capped at *max_draws* draws, which keeps
+        memory proportional to *max_draws* rather than the grid size.
+        """
+        if self.size <= min(max(max_draws, _INDEX_CHUNK), _EXACT_GRID_LIMIT):
+            perm = rng.permutation(self.size)
+            for start in range(0, self.size, _INDEX_CHUNK):
+                idx = perm[start : start + _INDEX_CHUNK]
+                yield idx[self.valid(idx)]
+            return
+        drawn: Set[int] = set()
+        n_draws = 0
+        while n_draws < max_draws:
+            n = min(_INDEX_CHUNK, max_draws - n_draws)
+            n_draws += n
+            idx = np.unique(rng.integers(0, self.size, size=n))
+            idx = rng.permutation(
+                np.array([i for i in idx if i not in drawn], dtype=np.int64)
+            )
+            drawn.update(idx.tolist())
+            yield idx[self.valid(idx)]
 
+    def digits_of(self, df: pd.DataFrame) -> np.ndarray:
+        """[n_rows, n_keys] value positions of *df*'s rows; -1 where off-grid."""
+        out = np.full((len(df), len(self.keys)), -1, dtype=np.int64)
+        for j, (k, vals) in enumerate(zip(self.keys, self.values)):
+            lookup = {canonical_value(v): d for d, v in enumerate(vals)}
+            col = df[k] if k in df.columns else pd.Series([None] * len(df))
+            out[:, j] = [lookup.get(canonical_value(v), -1) for v in col]
+        return out
 
-def _config_signature(
-    cfg: Dict[str, Any], keys: Sequence[str]
-) -> Tuple[Tuple[str, Any], ...]:
-    return tuple((k, _normalize_value(cfg.get(k))) for k in keys)
+
+def _lstm_dropout_mask(space: _GridSpace, digits: np.ndarray) -> np.ndarray:
+    """False for LSTM configs where dropout > 0 but num_layers == 1."""
+    num_layers = space.column(digits, "num_layers", 2)
+    dropout = space.column(digits, "dropout", 0.0)
+    return ~((num_layers == 1) & (dropout > 0.0))
 
 
 def _read_seen_signatures(
     csv_paths: Sequence[Union[str, Path]],
     keys: Sequence[str],
-) -> Set[Tuple[Tuple[str, Any], ...]]:
-    seen: Set[Tuple[Tuple[str, Any], ...]] = set()
+    where: Optional[Dict[str, Any]] = None,
+) -> Set[str]:
+    """Digests (``config_digest`` over *keys*) of the runs in *csv_paths*
+    matching *where*.
+
+    Served from each file's ``SignatureIndex``, which is only rebuilt from
+    the results when missing or out of date.
+    """
+    seen: Set[str] = set()
     for p in csv_paths:
         if p is None:
             continue
-        path = Path(p)
-        if not path.exists() or path.stat().st_size == 0:
-            continue
-        try:
-            df = pd.read_csv(path, on_bad_lines="skip")
-        except Exception:
-            continue
-        if df.empty:
-            continue
-        cols = [k for k in keys if k in df.columns]
-        if not cols:
-            continue
-        for _, row in df[cols].iterrows():
-            row_dict = {k: row[k] for k in cols}
-            # Fill missing keys with None so signatures match config dict shape.
-            for k in keys:
-                row_dict.setdefault(k, None)
-            seen.add(_config_signature(row_dict, keys))
+        seen |= SignatureIndex(p, keys, where).digests
     return seen
 
 
-def _weighted_sample_without_replacement(
-    population: List[Dict[str, Any]],
-    weights: np.ndarray,
-    k: int,
-    seed: int,
-) -> List[Dict[str, Any]]:
-    if k <= 0 or not population:
-        return []
-    if k >= len(population):
-        return list(population)
-    w = np.asarray(weights, dtype=np.float64)
-    if np.any(w < 0):
-        raise ValueError("weights must be non-negative")
-    if float(w.sum()) <= 0.0:
-        w = np.ones(len(population), dtype=np.float64)
-    probs = w / w.sum()
-    rng = np.random.default_rng(seed)
-    idx = rng.choice(len(population), size=k, replace=False, p=probs)
-    return [population[int(i)] for i in idx]
+def _search_grid(model_type: str, task_type: str) -> Dict[str, list]:
+    """Full hyperparameter grid for a model-task pair."""
+    if model_type == "vanilla_rnn":
+        arch_grid = {**VANILLA_RNN_ARCH_GRID, **VANILLA_RNN_ADDON_GRID}
+        train_grid = TRAINING_GRID
+    elif model_type == "lstm":
+        arch_grid = {**LSTM_ARCH_GRID, **LSTM_ADDON_GRID}
+        train_grid = LSTM_TRAINING_GRID
+    else:
+        raise ValueError(f"Unknown model_type: {model_type}")
+
+    task_grid = BEHAVIOR_TASK_GRID if task_type == "behavior" else NEURAL_TASK_GRID
+
+    return {**arch_grid, **train_grid, **task_grid}
+
+
+def _signature_keys(model_type: str, task_type: str) -> List[str]:
+    """Config keys that identify a run for deduplication."""
+    return sorted(
+        list(_search_grid(model_type, task_type))
+        + ["model_type", "task_type", "epochs"]
+    )
+
+
+def _grid_space(model_type: str, task_type: str) -> _GridSpace:
+    filters = [_lstm_dropout_mask] if model_type == "lstm" else []
+    return _GridSpace(_search_grid(model_type, task_type), filters)
 
 
 def generate_search_configs(
@@ -185,77 +268,48 @@ def generate_search_configs(
     Returns
     -------
     List of config dicts, each suitable for passing to ``run_single_config``.
+    Configs are built lazily from grid indices, so only the returned ones
+    are ever materialised.
     """
-    if model_type == "vanilla_rnn":
-        arch_grid = {**VANILLA_RNN_ARCH_GRID, **VANILLA_RNN_ADDON_GRID}
-        train_grid = TRAINING_GRID
-    elif model_type == "lstm":
-        arch_grid = {**LSTM_ARCH_GRID, **LSTM_ADDON_GRID}
-        train_grid = LSTM_TRAINING_GRID
-    else:
-        raise ValueError(f"Unknown model_type: {model_type}")
-
-    task_grid = BEHAVIOR_TASK_GRID if task_type == "behavior" else NEURAL_TASK_GRID
-
-    full_grid = {**arch_grid, **train_grid, **task_grid}
+    space = _grid_space(model_type, task_type)
+    sig_keys = _signature_keys(model_type, task_type)
+    seen_sigs: Set[str] = set()
+    if exclude_csv_paths:
+        seen_sigs = _read_seen_signatures(
+            exclude_csv_paths,
+            sig_keys,
+            {"model_type": model_type, "task_type": task_type},
+        )
 
-    grid_size = 1
-    for v in full_grid.values():
-        grid_size *= len(v)
+    if max_configs is None:
+        chunks = space.chunks()
+    else:
+        rng = np.random.default_rng(seed)
+        chunks = space.shuffled_chunks(rng, max_draws=max_configs * 200)
 
-    if max_configs is not None and grid_size > 500_000:
-        rng = random.Random(seed)
-        seen_sigs: Set[Tuple[Tuple[str, Any], ...]] = set()
-        if exclude_csv_paths:
-            dummy_keys = sorted(
-                list(full_grid.keys()) + ["model_type", "task_type", "epochs"]
-            )
-            seen_sigs = _read_seen_signatures(exclude_csv_paths, dummy_keys)
-
-        configs: List[Dict[str, Any]] = []
-        attempts = 0
-        max_attempts = max_configs * 200
-        while len(configs) < max_configs and attempts < max_attempts:
-            attempts += 1
-            cfg = {k: rng.choice(v) for k, v in full_grid.items()}
-            if (
-                model_type == "lstm"
-                and cfg.get("num_layers", 2) == 1
-                and cfg.get("dropout", 0.0) > 0.0
-            ):
-                continue
+    configs: List[Dict[str, Any]] = []
+    for idx in chunks:
+        for cfg in space.configs(idx):
             cfg["model_type"] = model_type
             cfg["task_type"] = task_type
             cfg["epochs"] = SWEEP_EPOCHS
-            sig = _config_signature(cfg, sorted(cfg.keys()))
-            if sig in seen_sigs:
+            # Distinct indices are distinct configs; only history can clash.
+            if seen_sigs and config_digest(cfg, sig_keys) in seen_sigs:
                 continue
-            seen_sigs.add(sig)
             configs.append(cfg)
-        return configs
-
-    configs = _dict_product(full_grid)
-
-    if model_type == "lstm":
-        configs = _filter_lstm_dropout(configs)
-
-    for cfg in configs:
-        cfg["model_type"] = model_type
-        cfg["task_type"] = task_type
-        cfg["epochs"] = SWEEP_EPOCHS
-
-    if exclude_csv_paths:
-        sig_keys = sorted(k for k in configs[0].keys()) if configs else []
-        seen_sigs_set = _read_seen_signatures(exclude_csv_paths, sig_keys)
-        configs = [
-            c for c in configs if _config_signature(c, sig_keys) not in seen_sigs_set
-        ]
+            if max_configs is not None and len(configs) >= max_configs:
+                return configs
+    return configs
 
-    if max_configs is not None and max_configs < len(configs):
-        rng = random.Random(seed)
-        configs = rng.sample(configs, max_configs)
 
-    return configs
+def _keep_top(
+    idx: np.ndarray, keys: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The *k* entries with the largest *keys*."""
+    if len(keys) <= k:
+        return idx, keys
+    top = np.argpartition(-keys, k - 1)[:k]
+    return idx[top], keys[top]
 
 
 def generate_refined_search_configs(
@@ -270,48 +324,31 @@ def generate_refined_search_configs(
     """Generate guided random configs from past top runs + exploration.
 
     Strategy:
-    1) Build the full grid and remove previously-evaluated configs.
+    1) Walk the grid in index space, skipping previously-evaluated configs.
     2) Estimate per-value quality from top historical runs for this model/task.
     3) Sample mostly by those weights, plus a uniform exploration fraction.
+
+    Candidate weights are a vectorised product of per-value scores over
+    index chunks, and sampling without replacement uses one random key per
+    index (Efraimidis-Spirakis), so memory stays bounded by *max_configs*
+    whatever the grid size.  Grids larger than ``_EXACT_GRID_LIMIT`` are
+    scored on a uniform pool of ``max(50_000, 20 * max_configs)`` draws.
     """
     if max_configs <= 0:
         return []
     if not (0.0 <= explore_frac <= 1.0):
         raise ValueError("explore_frac must be in [0, 1]")
 
-    candidates = generate_search_configs(
-        model_type=model_type,
-        task_type=task_type,
-        max_configs=max(50_000, max_configs * 20),
-        seed=seed,
-        exclude_csv_paths=results_csv_paths,
-    )
-    if not candidates:
-        return []
-
-    frames = []
-    for p in results_csv_paths:
-        path = Path(p)
-        if path.exists() and path.stat().st_size > 0:
-            try:
-                frames.append(pd.read_csv(path, on_bad_lines="skip"))
-            except Exception:
-                continue
-    if not frames:
-        return generate_search_configs(
-            model_type=model_type,
-            task_type=task_type,
-            max_configs=max_configs,
-            seed=seed,
-            exclude_csv_paths=results_csv_paths,
-        )
-
-    df_hist = pd.concat(frames, ignore_index=True)
+    df_all = read_results(results_csv_paths)
+    df_hist = df_all
     if "model_type" in df_hist.columns:
         df_hist = df_hist[df_hist["model_type"] == model_type]
     if "task_type" in df_hist.columns:
         df_hist = df_hist[df_hist["task_type"] == task_type]
     if "best_metric" in df_hist.columns:
+        # SQLite returns an all-NULL column as object dtype.
+        best_metric = pd.to_numeric(df_hist["best_metric"], errors="coerce")
+        df_hist = df_hist.assign(best_metric=best_metric)
         df_hist = df_hist[np.isfinite(df_hist["best_metric"])]
         df_hist = df_hist.sort_values("best_metric", ascending=False)
     if df_hist.empty:
@@ -324,49 +361,90 @@ def generate_refined_search_configs(
         )
     df_top = df_hist.head(min(top_k, len(df_hist)))
 
-    hp_keys = [k for k in candidates[0].keys() if k not in ("model_type", "task_type")]
-    key_values = {k: list({c[k] for c in candidates}) for k in hp_keys}
+    space = _grid_space(model_type, task_type)
+
+    # Previously evaluated configs, as grid indices.
+    seen_idx = np.empty(0, dtype=np.int64)
+    if not df_all.empty and space.keys:
+        df_seen = df_all
+        for k, v in (
+            ("model_type", model_type),
+            ("task_type", task_type),
+            ("epochs", SWEEP_EPOCHS),
+        ):
+            if k in df_seen.columns:
+                df_seen = df_seen[df_seen[k].map(canonical_value) == v]
+        seen_digits = space.digits_of(df_seen)
+        on_grid = (seen_digits >= 0).all(axis=1)
+        seen_idx = np.unique(
+            np.ravel_multi_index(tuple(seen_digits[on_grid].T), space.radices)
+        )
 
     # Laplace-smoothed per-value frequencies in top runs.
-    value_scores: Dict[str, Dict[Any, float]] = {}
-    for k in hp_keys:
+    top_digits = space.digits_of(df_top)
+    value_scores = []
+    for j, (k, radix) in enumerate(zip(space.keys, space.radices)):
         if k not in df_top.columns:
-            value_scores[k] = {v: 1.0 for v in key_values[k]}
+            value_scores.append(np.ones(radix))
             continue
-        counts = df_top[k].apply(_normalize_value).value_counts(dropna=False).to_dict()
-        denom = float(len(df_top) + len(key_values[k]))
-        value_scores[k] = {
-            v: (float(counts.get(v, 0.0)) + 1.0) / denom for v in key_values[k]
-        }
-
-    guided_weights = []
-    for cfg in candidates:
-        w = 1.0
-        for k in hp_keys:
-            w *= value_scores[k].get(_normalize_value(cfg[k]), 1e-9)
-        guided_weights.append(w)
-    guided_weights_np = np.asarray(guided_weights, dtype=np.float64)
-
-    k_total = min(max_configs, len(candidates))
+        d = top_digits[:, j]
+        counts = np.bincount(d[d >= 0], minlength=radix).astype(np.float64)
+        value_scores.append((counts + 1.0) / float(len(df_top) + radix))
+
+    rng = np.random.default_rng(seed)
+    if space.size <= _EXACT_GRID_LIMIT:
+        chunks = space.chunks()
+    else:
+        pool = np.unique(
+            rng.integers(0, space.size, size=max(50_000, max_configs * 20))
+        )
+        chunks = (
+            c[space.valid(c)]
+            for c in np.array_split(pool, max(1, len(pool) // _INDEX_CHUNK))
+        )
+
+    empty_i, empty_k = np.empty(0, dtype=np.int64), np.empty(0)
+    guided_idx, guided_key = empty_i, empty_k
+    explore_idx, explore_key = empty_i, empty_k
+    n_available = 0
+    for idx in chunks:
+        idx = idx[~np.isin(idx, seen_idx)]
+        if len(idx) == 0:
+            continue
+        n_available += len(idx)
+        digits = space.digits(idx)
+        w = np.ones(len(idx))
+        for j, scores in enumerate(value_scores):
+            w *= scores[digits[:, j]]
+        with np.errstate(divide="ignore"):
+            key = np.log(rng.random(len(idx))) / w
+        guided_idx, guided_key = _keep_top(
+            np.concatenate([guided_idx, idx]),
+            np.concatenate([guided_key, key]),
+            max_configs,
+        )
+        explore_idx, explore_key = _keep_top(
+            np.concatenate([explore_idx, idx]),
+            np.concatenate([explore_key, rng.random(len(idx))]),
+            2 * max_configs,
+        )
+    if n_available == 0:
+        return []
+
+    k_total = min(max_configs, n_available)
     k_explore = int(round(k_total * explore_frac))
     k_guided = max(0, k_total - k_explore)
 
-    guided = _weighted_sample_without_replacement(
-        population=candidates,
-        weights=guided_weights_np,
-        k=k_guided,
-        seed=seed,
-    )
+    guided = guided_idx[np.argsort(-guided_key, kind="stable")][:k_guided]
+    explore = explore_idx[np.argsort(-explore_key, kind="stable")]
+    explore = explore[~np.isin(explore, guided)][:k_explore]
 
-    chosen_sigs = {_config_signature(c, sorted(c.keys())) for c in guided}
-    remaining = [
-        c
-        for c in candidates
-        if _config_signature(c, sorted(c.keys())) not in chosen_sigs
-    ]
-    rng = random.Random(seed + 1)
-    explore = rng.sample(remaining, min(k_explore, len(remaining))) if remaining else []
-    return guided + explore
+    configs = list(space.configs(np.concatenate([guided, explore])))
+    for cfg in configs:
+        cfg["model_type"] = model_type
+        cfg["task_type"] = task_type
+        cfg["epochs"] = SWEEP_EPOCHS
+    return configs
 
 
 # ---------------------------------------------------------------------------
@@ -392,6 +470,8 @@ def _build_model(
             dt=1.0,
             tau=config["tau"],
             g=config["g"],
+            fused=config.get("fused", False),
+            checkpoint_segment=config.get("checkpoint_segment"),
         )
     elif model_type == "lstm":
         cls = LSTMBehavior if task_type == "behavior" else LSTMNeural
@@ -455,6 +535,12 @@ def run_single_config(
         normalize_inputs=config.get("normalize_inputs", False),
         print_every=print_every,
         device=device,
+        prefetch=config.get("prefetch", 0),
+        eval_every=config.get("eval_every", 1),
+        train_eval=config.get("train_eval", "full"),
+        eval_subsample=config.get("eval_subsample", 256),
+        precision=config.get("precision", "fp32"),
+        tbptt=config.get("tbptt"),
     )
 
     return results
@@ -464,6 +550,188 @@ def run_single_config(
 # Sweep runner
 # ---------------------------------------------------------------------------
 
+_PROVENANCE_KEYS = {
+    "animal_name",
+    "session",
+    "session_date",
+    "target_key",
+    "target_aggregation",
+    "data_root",
+}
+
+
+def _failed_results(has_val: bool) -> Dict[str, Any]:
+    return {
+        "loss_hist": [],
+        "metric_hist": [],
+        "best_metric": float("nan"),
+        "best_epoch": 0,
+        "final_metric": float("nan"),
+        "final_loss": float("nan"),
+        "metric_source": "val" if has_val else "train",
+        "final_train_metric": float("nan"),
+        "final_train_loss": float("nan"),
+        "final_val_metric": float("nan"),
+        "final_val_loss": float("nan"),
+        "elapsed_sec": 0.0,
+    }
+
+
+def _run_config_logged(
+    i: int,
+    n_total: int,
+    cfg: Dict[str, Any],
+    X_train: torch.Tensor,
+    Y_train: torch.Tensor,
+    X_val: Optional[torch.Tensor],
+    Y_val: Optional[torch.Tensor],
+    input_size: int,
+    output_size: int,
+    device: torch.device,
+    patience: Optional[int],
+    print_every: int,
+) -> Dict[str, Any]:
+    """Train one config, printing its header; failures become NaN results."""
+    hp_summary = ", ".join(
+        f"{k}={v}"
+        for k, v in sorted(cfg.items())
+        if k not in ("model_type", "task_type")
+    )
+    print(f"\n{'=' * 80}")
+    print(f"Run {i}/{n_total}: {cfg['model_type']} {cfg['task_type']} | {hp_summary}")
+    print(f"{'=' * 80}")
+
+    try:
+        return run_single_config(
+            config=cfg,
+            X_train=X_train,
+            Y_train=Y_train,
+            X_val=X_val,
+            Y_val=Y_val,
+            input_size=input_size,
+            output_size=output_size,
+            device=device,
+            patience=patience,
+            print_every=print_every,
+        )
+    except Exception as e:
+        print(f"Run {i}/{n_total} FAILED: {e}")
+        return _failed_results(X_val is not None and Y_val is not None)
+
+
+def _result_row(
+    cfg: Dict[str, Any],
+    results: Dict[str, Any],
+    row_metadata: Dict[str, Any],
+) -> Dict[str, Any]:
+    cfg_payload = {
+        k: v
+        for k, v in cfg.items()
+        if k not in ("model_type", "task_type", "precision")
+        and k not in _PROVENANCE_KEYS
+    }
+    return {
+        "run_id": str(uuid.uuid4())[:8],
+        "timestamp": datetime.now().isoformat(),
+        "model_type": cfg["model_type"],
+        "task_type": cfg["task_type"],
+        **cfg_payload,
+        "animal_name": cfg.get("animal_name", row_metadata.get("animal_name")),
+        "session": cfg.get("session", row_metadata.get("session")),
+        "session_date": cfg.get("session_date", row_metadata.get("session_date")),
+        "target_key": cfg.get("target_key", row_metadata.get("target_key")),
+        "target_aggregation": cfg.get(
+            "target_aggregation", row_metadata.get("target_aggregation")
+        ),
+        "data_root": cfg.get("data_root", row_metadata.get("data_root")),
+        "precision": cfg.get("precision", "fp32"),
+        "val_fraction": row_metadata.get("val_fraction"),
+        "min_val_trials": row_metadata.get("min_val_trials"),
+        "best_metric": results["best_metric"],
+        "best_epoch": results["best_epoch"],
+        "final_metric": results["final_metric"],
+        "final_loss": results["final_loss"],
+        "metric_source": results.get("metric_source", "train"),
+        "final_train_metric": results.get("final_train_metric", float("nan")),
+        "final_train_loss": results.get("final_train_loss", float("nan")),
+        "final_val_metric": results.get("final_val_metric", float("nan")),
+        "final_val_loss": results.get("final_val_loss", float("nan")),
+        "elapsed_sec": results["elapsed_sec"],
+        "loss_hist": json.dumps(results["loss_hist"]),
+        "metric_hist": json.dumps(results["metric_hist"]),
+        "train_loss_hist": json.dumps(results.get("train_loss_hist", [])),
+        "train_metric_hist": json.dumps(results.get("train_metric_hist", [])),
+        "val_loss_hist": json.dumps(results.get("val_loss_hist", [])),
+        "val_metric_hist": json.dumps(results.get("val_metric_hist", [])),
+    }
+
+
+def _append_result_row(
+    store,
+    indexes: Dict[Tuple[str, str], SignatureIndex],
+    cfg: Dict[str, Any],
+    row: Dict[str, Any],
+    results: Dict[str, Any],
+) -> None:
+    """Flush one finished run to the results store and print its summary line."""
+    key = (cfg["model_type"], cfg["task_type"])
+    if key not in indexes:
+        # Opened before the append so it is not considered stale afterwards.
+        indexes[key] = SignatureIndex(
+            store.path,
+            _signature_keys(*key),
+            {"model_type": key[0], "task_type": key[1]},
+        )
+    # Append this row immediately so progress survives interruptions; the
+    # store handles column evolution across sweep rounds.
+    store.append(row)
+    indexes[key].add([cfg])
+
+    metric_name = "accuracy" if row["task_type"] == "behavior" else "pearson_r"
+    source = results.get("metric_source", "train")
+    print(
+        f"Result: best_{source}_{metric_name}={results['best_metric']:.4f} @ epoch {results['best_epoch']} "
+        f"| final_{source}={results['final_metric']:.4f} | {results['elapsed_sec']:.1f}s"
+    )
+    print(f"(saved to {store.path})")
+
+
+# Per-process state for pool workers, filled once by ``_sweep_worker_init``.
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _sweep_worker_init(
+    tensors: Tuple[Optional[torch.Tensor], ...],
+    device: torch.device,
+    num_threads: int,
+    run_kwargs: Dict[str, Any],
+) -> None:
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    _WORKER_STATE["tensors"] = tuple(
+        None if t is None else t.to(device) for t in tensors
+    )
+    _WORKER_STATE["device"] = device
+    _WORKER_STATE["run_kwargs"] = run_kwargs
+
+
+def _sweep_worker_run(i: int, n_total: int, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    X_train, Y_train, X_val, Y_val = _WORKER_STATE["tensors"]
+    return _run_config_logged(
+        i,
+        n_total,
+        cfg,
+        X_train,
+        Y_train,
+        X_val,
+        Y_val,
+        device=_WORKER_STATE["device"],
+        **_WORKER_STATE["run_kwargs"],
+    )
+
 
 def run_sweep(
     configs: List[Dict[str, Any]],
@@ -478,6 +746,8 @@ def run_sweep(
     results_csv: str = "results/sweep_results.csv",
     patience: Optional[int] = None,
     print_every: int = 500,
+    n_workers: int = 1,
+    threads_per_worker: int = 1,
 ) -> pd.DataFrame:
     """Run a full hyperparameter sweep and log results to CSV.
 
@@ -492,139 +762,87 @@ def run_sweep(
     device : torch.device
         Device for training.
     results_csv : str
-        Path to CSV file for logging (appended if it exists).
+        Results file, appended if it exists.  A ``.db``/``.sqlite`` suffix
+        selects the SQLite backend, anything else a CSV file (see
+        ``results_store``).
     patience : int or None
         Early-stopping patience forwarded to ``run_training``.
     print_every : int
         Print interval forwarded to ``run_training``.
+    n_workers : int
+        Number of worker processes.  ``1`` trains configs one after another
+        in this process.  With more workers, the data tensors are moved to
+        shared memory once and every worker trains whole configs with
+        ``torch.set_num_threads(threads_per_worker)``.  The parent still
+        appends each row to CSV as soon as its run finishes.
+    threads_per_worker : int
+        Intra-op threads per worker process (ignored when ``n_workers == 1``).
 
     Returns
     -------
-    pd.DataFrame with one row per config.
+    pd.DataFrame with one row per config, in config order.
     """
     results_path = Path(results_csv)
     results_path.parent.mkdir(parents=True, exist_ok=True)
+    store = open_results_store(results_path)
 
-    rows: List[Dict[str, Any]] = []
     n_total = len(configs)
     row_metadata = dict(row_metadata or {})
-
-    for i, cfg in enumerate(configs, 1):
-        run_id = str(uuid.uuid4())[:8]
-        model_type = cfg["model_type"]
-        task_type = cfg["task_type"]
-
-        hp_summary = ", ".join(
-            f"{k}={v}"
-            for k, v in sorted(cfg.items())
-            if k not in ("model_type", "task_type")
-        )
-        print(f"\n{'=' * 80}")
-        print(f"Run {i}/{n_total}: {model_type} {task_type} | {hp_summary}")
-        print(f"{'=' * 80}")
-
-        try:
-            results = run_single_config(
-                config=cfg,
-                X_train=X_train,
-                Y_train=Y_train,
-                X_val=X_val,
-                Y_val=Y_val,
-                input_size=input_size,
-                output_size=output_size,
+    run_kwargs = dict(
+        input_size=input_size,
+        output_size=output_size,
+        patience=patience,
+        print_every=print_every,
+    )
+    rows: Dict[int, Dict[str, Any]] = {}
+    indexes: Dict[Tuple[str, str], SignatureIndex] = {}
+
+    if n_workers <= 1 or n_total <= 1:
+        for i, cfg in enumerate(configs, 1):
+            results = _run_config_logged(
+                i,
+                n_total,
+                cfg,
+                X_train,
+                Y_train,
+                X_val,
+                Y_val,
                 device=device,
-                patience=patience,
-                print_every=print_every,
+                **run_kwargs,
             )
-        except Exception as e:
-            print(f"Run {i}/{n_total} FAILED: {e}")
-            results = {
-                "loss_hist": [],
-                "metric_hist": [],
-                "best_metric": float("nan"),
-                "best_epoch": 0,
-                "final_metric": float("nan"),
-                "final_loss": float("nan"),
-                "metric_source": "val"
-                if (X_val is not None and Y_val is not None)
-                else "train",
-                "final_train_metric": float("nan"),
-                "final_train_loss": float("nan"),
-                "final_val_metric": float("nan"),
-                "final_val_loss": float("nan"),
-                "elapsed_sec": 0.0,
-            }
-
-        provenance_keys = {
-            "animal_name",
-            "session",
-            "session_date",
-            "target_key",
-            "target_aggregation",
-            "data_root",
-        }
-        cfg_payload = {
-            k: v
-            for k, v in cfg.items()
-            if k not in ("model_type", "task_type") and k not in provenance_keys
-        }
-
-        row = {
-            "run_id": run_id,
-            "timestamp": datetime.now().isoformat(),
-            "model_type": model_type,
-            "task_type": task_type,
-            **cfg_payload,
-            "animal_name": cfg.get("animal_name", row_metadata.get("animal_name")),
-            "session": cfg.get("session", row_metadata.get("session")),
-            "session_date": cfg.get("session_date", row_metadata.get("session_date")),
-            "target_key": cfg.get("target_key", row_metadata.get("target_key")),
-            "target_aggregation": cfg.get(
-                "target_aggregation", row_metadata.get("target_aggregation")
-            ),
-            "data_root": cfg.get("data_root", row_metadata.get("data_root")),
-            "val_fraction": row_metadata.get("val_fraction"),
-            "min_val_trials": row_metadata.get("min_val_trials"),
-            "best_metric": results["best_metric"],
-            "best_epoch": results["best_epoch"],
-            "final_metric": results["final_metric"],
-            "final_loss": results["final_loss"],
-            "metric_source": results.get("metric_source", "train"),
-            "final_train_metric": results.get("final_train_metric", float("nan")),
-            "final_train_loss": results.get("final_train_loss", float("nan")),
-            "final_val_metric": results.get("final_val_metric", float("nan")),
-            "final_val_loss": results.get("final_val_loss", float("nan")),
-            "elapsed_sec": results["elapsed_sec"],
-            "loss_hist": json.dumps(results["loss_hist"]),
-            "metric_hist": json.dumps(results["metric_hist"]),
-            "train_loss_hist": json.dumps(results.get("train_loss_hist", [])),
-            "train_metric_hist": json.dumps(results.get("train_metric_hist", [])),
-            "val_loss_hist": json.dumps(results.get("val_loss_hist", [])),
-            "val_metric_hist": json.dumps(results.get("val_metric_hist", [])),
-        }
-        rows.append(row)
-
-        # Flush this row to CSV immediately so progress survives interruptions.
-        # Read-concat-write to handle column evolution across sweep rounds.
-        row_df = pd.DataFrame([row])
-        if results_path.exists() and results_path.stat().st_size > 0:
-            existing = pd.read_csv(results_path, on_bad_lines="skip")
-            merged = pd.concat([existing, row_df], ignore_index=True)
-        else:
-            merged = row_df
-        merged.to_csv(results_path, index=False)
-
-        metric_name = "accuracy" if task_type == "behavior" else "pearson_r"
-        source = results.get("metric_source", "train")
+            rows[i] = _result_row(cfg, results, row_metadata)
+            _append_result_row(store, indexes, cfg, rows[i], results)
+    else:
+        tensors = tuple(
+            None if t is None else t.detach().cpu().share_memory_()
+            for t in (X_train, Y_train, X_val, Y_val)
+        )
+        n_workers = min(n_workers, n_total)
         print(
-            f"Result: best_{source}_{metric_name}={results['best_metric']:.4f} @ epoch {results['best_epoch']} "
-            f"| final_{source}={results['final_metric']:.4f} | {results['elapsed_sec']:.1f}s"
+            f"Running {n_total} configs on {n_workers} worker processes "
+            f"({threads_per_worker} thread(s) each)"
         )
-        print(f"(saved to {results_csv})")
-
-    print(
-        f"\nSweep complete. {results_csv} now has "
-        f"{len(pd.read_csv(results_path, on_bad_lines='skip'))} total rows."
-    )
-
-    return pd.DataFrame(rows)
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=torch.multiprocessing.get_context("spawn"),
+            initializer=_sweep_worker_init,
+            initargs=(tensors, device, threads_per_worker, run_kwargs),
+        ) as pool:
+            futures = {
+                pool.submit(_sweep_worker_run, i, n_total, cfg): (i, cfg)
+                for i, cfg in enumerate(configs, 1)
+            }
+            for fut in as_completed(futures):
+                i, cfg = futures[fut]
+                try:
+                    results = fut.result()
+                except Exception as e:
+                    # Only reached if the worker process itself died.
+                    print(f"Run {i}/{n_total} FAILED: {e}")
+                    results = _failed_results(X_val is not None and Y_val is not None)
+                rows[i] = _result_row(cfg, results, row_metadata)
+                _append_result_row(store, indexes, cfg, rows[i], results)
+
+    print(f"\nSweep complete. {results_csv} now has {len(store.read())} total rows.")
+
+    return pd.DataFrame([rows[i] for i in sorted(rows)])
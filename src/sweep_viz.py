@@ -1,25 +1,36 @@
 """Generalized visualization tools for hyperparameter sweep results.
 
-All plotting functions read from a pandas DataFrame (typically loaded from the
-sweep CSV produced by ``sweep.run_sweep``).  They are architecture-agnostic
+All plotting functions read from a pandas DataFrame (typically loaded with
+``load_sweep_results`` from the CSV or SQLite file written by
+``sweep.run_sweep``).  They are architecture-agnostic
 and work for any combination of model types and task types.
 """
 
 from __future__ import annotations
 
 import json
-from typing import List, Optional, Tuple
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from results_store import read_results
+
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
 
+def load_sweep_results(
+    paths: Union[str, Path, Sequence[Union[str, Path]]],
+) -> pd.DataFrame:
+    """Load one or more sweep result files (CSV or SQLite) into one DataFrame."""
+    return read_results(paths)
+
+
 def _metric_label(task_type: str) -> str:
     return "Accuracy" if task_type == "behavior" else "Pearson r"
 
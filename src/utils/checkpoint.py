@@ -0,0 +1,101 @@
+import os
+import threading
+from pathlib import Path
+
+import torch
+
+
+class BestStateBuffer:
+    """Best-so-far copy of a model's ``state_dict`` without per-save allocation.
+
+    In-memory mode (default): the first ``save`` allocates one shadow tensor
+    per state entry, and every later ``save`` copies the live weights into
+    them in place with ``torch._foreach_copy_``.
+
+    Spill mode (``spill_path`` given): each ``save`` copies the weights into a
+    host staging buffer (pinned for CUDA) that a background thread writes to
+    ``spill_path`` and then releases, so no full snapshot stays resident
+    between saves.  A new save first waits for the previous write.
+
+    Usage:
+        best = BestStateBuffer()
+        ...
+        if improved:
+            best.save(model)
+        ...
+        if best.has_state:
+            best.restore(model)
+    """
+
+    def __init__(self, spill_path=None):
+        self.spill_path = Path(spill_path) if spill_path is not None else None
+        self.has_state = False
+        self._keys = None
+        self._shadow = None
+        self._writer = None
+        self._error = None
+
+    @staticmethod
+    def _copy(dst, src):
+        if hasattr(torch, "_foreach_copy_"):
+            torch._foreach_copy_(dst, src)
+        else:
+            for d, s in zip(dst, src):
+                d.copy_(s)
+
+    @torch.no_grad()
+    def save(self, model: torch.nn.Module):
+        state = model.state_dict()
+        live = list(state.values())
+        if self.spill_path is None:
+            if self._shadow is None:
+                self._keys = list(state.keys())
+                self._shadow = [torch.empty_like(t) for t in live]
+            self._copy(self._shadow, live)
+        else:
+            self.wait()
+            self._keys = list(state.keys())
+            pin = any(t.is_cuda for t in live)
+            staging = [
+                torch.empty(t.shape, dtype=t.dtype, pin_memory=pin) for t in live
+            ]
+            for dst, src in zip(staging, live):
+                dst.copy_(src, non_blocking=pin)
+            if pin:
+                torch.cuda.synchronize()
+            self._writer = threading.Thread(
+                target=self._write, args=(dict(zip(self._keys, staging)),), daemon=True
+            )
+            self._writer.start()
+        self.has_state = True
+
+    def _write(self, snapshot):
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.spill_path.with_name(self.spill_path.name + ".tmp")
+            torch.save(snapshot, tmp_path)
+            os.replace(tmp_path, self.spill_path)
+        except BaseException as e:  # re-raised in the training thread
+            self._error = e
+
+    def wait(self):
+        """Block until a pending spill has been written."""
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+    def state_dict(self, map_location=None):
+        """The saved state (shadow tensors, or loaded back from disk)."""
+        if not self.has_state:
+            return None
+        if self.spill_path is None:
+            return dict(zip(self._keys, self._shadow))
+        self.wait()
+        return torch.load(self.spill_path, map_location=map_location)
+
+    def restore(self, model: torch.nn.Module):
+        device = next(model.parameters()).device
+        model.load_state_dict(self.state_dict(map_location=device))
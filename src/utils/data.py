@@ -1,6 +1,8 @@
+import json
 import numpy as np
 import os
 import torch
+from pathlib import Path
 
 
 def get_dmat(learner="early"):
@@ -67,6 +69,203 @@ def reshape_XY(X, Y, b_per_trial):
     return X, Y
 
 
+def _dmat_to_trials(X, Y, bins_per_trial):
+    """(trials, bins, features) views of DMAT X/Y.
+
+    2D arrays are (rows, features) with ``bins_per_trial`` rows per trial
+    (an incomplete last trial is dropped); 3D arrays are
+    (features, bins, trials) and keep their own bin count.
+    """
+    if X.ndim == 2:
+        if X.shape[0] != Y.shape[0]:
+            raise ValueError(f"DMAT X/Y row mismatch: {X.shape[0]} vs {Y.shape[0]}")
+        return reshape_XY(X, Y, bins_per_trial)
+    if X.ndim == 3:
+        if Y.ndim != 3 or Y.shape[1:] != X.shape[1:]:
+            raise ValueError(
+                f"3D DMAT X/Y bins/trials mismatch: X={X.shape}, Y={Y.shape}"
+            )
+        return np.transpose(X, (2, 1, 0)), np.transpose(Y, (2, 1, 0))
+    raise ValueError(f"Unsupported DMAT X shape {X.shape}; expected 2D or 3D.")
+
+
+def dmat_cache_paths(dmat_path, bins_per_trial=299, cache_dir=None):
+    """Cache files ``(X.npy, Y.npy, meta.json)`` for a DMAT npz."""
+    dmat_path = Path(dmat_path)
+    cache_dir = Path(cache_dir) if cache_dir else dmat_path.parent / ".dmat_cache"
+    stem = f"{dmat_path.stem}-b{int(bins_per_trial)}"
+    return (
+        cache_dir / f"{stem}-X.npy",
+        cache_dir / f"{stem}-Y.npy",
+        cache_dir / f"{stem}.json",
+    )
+
+
+def _write_npy_atomic(path, arr):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=arr.shape)
+    out[...] = arr
+    out.flush()
+    del out
+    os.replace(tmp, path)
+
+
+def build_dmat_cache(dmat_path, bins_per_trial=299, cache_dir=None):
+    """Convert a DMAT npz once into float32 (trials, bins, features) ``.npy`` files.
+
+    Incomplete trials at the end of a 2D DMAT are dropped; the original row
+    count is kept in the JSON sidecar so strict loads can still reject it.
+    The sidecar is written last, so a cache without it is never used.
+    """
+    dmat_path = Path(dmat_path)
+    x_path, y_path, meta_path = dmat_cache_paths(dmat_path, bins_per_trial, cache_dir)
+    x_path.parent.mkdir(parents=True, exist_ok=True)
+    d = np.load(dmat_path)
+    if "X" not in d.files or "Y" not in d.files:
+        raise ValueError(f"DMAT file {dmat_path} must contain both 'X' and 'Y' arrays.")
+    X, Y = d["X"], d["Y"]
+    x_trials, y_trials = _dmat_to_trials(X, Y, bins_per_trial)
+    _write_npy_atomic(x_path, x_trials)
+    _write_npy_atomic(y_path, y_trials)
+    meta = {
+        "source": str(dmat_path.resolve()),
+        "source_mtime_ns": dmat_path.stat().st_mtime_ns,
+        "source_shape_X": list(X.shape),
+        "source_shape_Y": list(Y.shape),
+        "bins_per_trial": int(bins_per_trial),
+    }
+    tmp = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(meta, indent=2))
+    os.replace(tmp, meta_path)
+    return meta
+
+
+def load_dmat_trials(dmat_path, bins_per_trial=299, truncate=False, cache_dir=None):
+    """Load a DMAT npz as read-only float32 (trials, bins, features) memmaps.
+
+    The first call converts the npz into an uncompressed ``.npy`` cache
+    (see ``build_dmat_cache``), rebuilt whenever the npz is newer.  Later
+    calls only map the cache with ``mmap_mode='r'``, so startup does no
+    decompression or casting and all processes loading the same session
+    share one copy of the data through the page cache.
+
+    With ``truncate=False`` a 2D DMAT whose rows are not a multiple of
+    ``bins_per_trial`` raises ``ValueError``; otherwise the incomplete last
+    trial is dropped.
+
+    Returns
+    -------
+    x, y : np.memmap, each (trials, bins, features)
+    """
+    dmat_path = Path(dmat_path)
+    x_path, y_path, meta_path = dmat_cache_paths(dmat_path, bins_per_trial, cache_dir)
+    meta = None
+    if meta_path.exists() and x_path.exists() and y_path.exists():
+        meta = json.loads(meta_path.read_text())
+        if meta.get("source_mtime_ns") != dmat_path.stat().st_mtime_ns:
+            meta = None
+    if meta is None:
+        meta = build_dmat_cache(dmat_path, bins_per_trial, cache_dir)
+    n_rows = meta["source_shape_X"][0]
+    if (
+        not truncate
+        and len(meta["source_shape_X"]) == 2
+        and n_rows % bins_per_trial != 0
+    ):
+        raise ValueError(
+            f"Rows {n_rows} not divisible by bins_per_trial={bins_per_trial}."
+        )
+    return np.load(x_path, mmap_mode="r"), np.load(y_path, mmap_mode="r")
+
+
+class TensorBatchLoader:
+    """Minibatches over in-memory tensors without per-sample collation.
+
+    Drop-in for ``DataLoader(TensorDataset(*tensors), batch_size, shuffle)``:
+    iterating yields tuples of batch tensors (``(x, y)`` or ``(x, z, y)``).
+    Each epoch shuffles with a single ``torch.randperm`` and gathers every
+    batch with one ``index_select`` per tensor; without shuffling batches are
+    plain slices (views, no copy).
+
+    Instead of tensors a single *source* object with ``__len__`` and
+    ``batch(idx) -> tuple`` can be passed, for datasets that assemble a batch
+    from shared base tensors (e.g. ``TrialContextDataset``).
+
+    ``block_shuffle=True`` (with ``shuffle``) shuffles the order of
+    contiguous batches instead of the samples, so each batch still holds
+    consecutive samples (used to share trials between trial-context
+    windows in a batch).  The samples are rotated by a random offset each
+    epoch so the batch boundaries move; the one batch that wraps past the
+    end holds two runs.
+    """
+
+    def __init__(
+        self,
+        *tensors,
+        batch_size=1,
+        shuffle=False,
+        drop_last=False,
+        generator=None,
+        block_shuffle=False,
+    ):
+        if not tensors:
+            raise ValueError("TensorBatchLoader needs at least one tensor")
+        if len(tensors) == 1 and hasattr(tensors[0], "batch"):
+            self.source = tensors[0]
+            self.tensors = None
+            self.n = len(self.source)
+        else:
+            n = tensors[0].shape[0]
+            if any(t.shape[0] != n for t in tensors):
+                raise ValueError("All tensors must have the same length")
+            self.source = None
+            self.tensors = tensors
+            self.n = n
+        self.batch_size = max(1, int(batch_size))
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = generator
+        self.block_shuffle = block_shuffle
+
+    def __len__(self):
+        if self.drop_last:
+            return self.n // self.batch_size
+        return -(-self.n // self.batch_size)
+
+    def _take(self, idx):
+        if self.source is not None:
+            return self.source.batch(idx)
+        return tuple(t.index_select(0, idx.to(t.device)) for t in self.tensors)
+
+    def _slice(self, start):
+        end = min(start + self.batch_size, self.n)
+        if self.source is not None:
+            return self.source.batch(torch.arange(start, end))
+        return tuple(t[start:end] for t in self.tensors)
+
+    def __iter__(self):
+        stop = len(self) * self.batch_size if self.drop_last else self.n
+        starts = range(0, stop, self.batch_size)
+        if self.shuffle and self.block_shuffle:
+            offset = int(
+                torch.randint(
+                    max(1, min(self.batch_size, self.n)), (1,), generator=self.generator
+                )
+            )
+            order = torch.randperm(len(starts), generator=self.generator)
+            for i in order.tolist():
+                start = starts[i] + offset
+                end = min(start + self.batch_size, stop + offset)
+                yield self._take(torch.arange(start, end) % self.n)
+        elif self.shuffle:
+            order = torch.randperm(self.n, generator=self.generator)
+            for start in starts:
+                yield self._take(order[start : start + self.batch_size])
+        else:
+            for start in starts:
+                yield self._slice(start)
+
+
 def add_sigmoid_params(trial_data, session_data, mb_sigms, mf_sigms):
     for i, block_idx in enumerate(session_data["MBblocks"]):
         mask = (trial_data["is_mb"] == 1) & (trial_data["iblock"] == block_idx)
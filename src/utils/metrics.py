@@ -0,0 +1,70 @@
+import torch
+
+
+class StreamingPearson:
+    """Pearson r over a stream of (y_true, y_pred) batches, flattened.
+
+    Keeps the running sums n, Σx, Σy, Σx², Σy², Σxy as float64 tensors on the
+    device of the first batch (float32 on MPS, which has no float64), so
+    ``update`` never leaves the device and ``compute`` returns a 0-d tensor.
+    Only ``result`` synchronises, to hand back a Python float.
+
+    Values are shifted by the first batch's means before accumulating, which
+    leaves r unchanged but avoids cancellation in Σx² - (Σx)²/n.
+
+    Usage:
+        acc = StreamingPearson()
+        for xb, yb in loader:
+            acc.update(yb, model(xb)[0])
+        r = acc.result()
+    """
+
+    def __init__(self, eps: float = 1e-12):
+        self.eps = eps
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self._shift = None
+        self._sums = None
+
+    @torch.no_grad()
+    def update(self, y_true: torch.Tensor, y_pred: torch.Tensor):
+        x = y_true.detach().reshape(-1)
+        y = y_pred.detach().reshape(-1)
+        if x.numel() == 0:
+            return self
+        if self._sums is None:
+            dtype = torch.float32 if x.device.type == "mps" else torch.float64
+            self._shift = torch.stack([x.mean(), y.mean()]).to(dtype)
+            self._sums = torch.zeros(5, dtype=dtype, device=x.device)
+        x = x.to(self._sums.dtype) - self._shift[0]
+        y = y.to(self._sums.dtype) - self._shift[1]
+        self._sums += torch.stack(
+            [x.sum(), y.sum(), x.square().sum(), y.square().sum(), (x * y).sum()]
+        )
+        self.n += x.numel()
+        return self
+
+    def compute(self) -> torch.Tensor:
+        """r as a 0-d tensor on the accumulator's device (NaN if undefined)."""
+        if self._sums is None or self.n < 2:
+            return torch.tensor(float("nan"))
+        sx, sy, sxx, syy, sxy = self._sums
+        n = self.n
+        var_x = (sxx - sx * sx / n) / n
+        var_y = (syy - sy * sy / n) / n
+        cov = (sxy - sx * sy / n) / n
+        std_x = var_x.clamp(min=0).sqrt()
+        std_y = var_y.clamp(min=0).sqrt()
+        r = (cov / (std_x * std_y)).clamp(-1.0, 1.0)
+        undefined = (std_x <= self.eps) | (std_y <= self.eps)
+        return torch.where(undefined, torch.full_like(r, float("nan")), r)
+
+    def result(self) -> float:
+        return float(self.compute())
+
+
+def pearson_r(y_true: torch.Tensor, y_pred: torch.Tensor) -> float:
+    """Pearson r between two tensors, flattened, computed on their device."""
+    return StreamingPearson().update(y_true, y_pred).result()
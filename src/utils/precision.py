@@ -0,0 +1,50 @@
+import contextlib
+
+import torch
+
+# Autocast dtype for each supported ``precision`` setting.
+PRECISION_DTYPES = {
+    "fp32": None,
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+}
+
+
+def check_precision(precision: str, device=None) -> str:
+    """Validate *precision*; ``"fp16"`` additionally requires a CUDA *device*."""
+    if precision not in PRECISION_DTYPES:
+        raise ValueError(
+            f"Unknown precision: {precision} (expected one of {sorted(PRECISION_DTYPES)})"
+        )
+    if (
+        precision == "fp16"
+        and device is not None
+        and torch.device(device).type != "cuda"
+    ):
+        raise ValueError("precision='fp16' needs a CUDA device; use 'bf16' on CPU")
+    return precision
+
+
+def autocast(device, precision: str = "fp32"):
+    """Autocast context for *precision* on *device*; a no-op for ``"fp32"``.
+
+    bf16 is the intended CPU mode.  Parameters, optimizer state and the
+    inputs stay float32; only autocast-eligible ops (matmuls, LSTM, linear
+    layers) run in the lower precision.
+    """
+    dtype = PRECISION_DTYPES[check_precision(precision)]
+    if dtype is None:
+        return contextlib.nullcontext()
+    device_type = torch.device(device).type
+    return torch.autocast(device_type=device_type, dtype=dtype)
+
+
+def grad_scaler(device, precision: str = "fp32"):
+    """Dynamic loss scaler for ``"fp16"``, ``None`` otherwise.
+
+    bf16 has the float32 exponent range, so its gradients do not underflow
+    and need no scaling.
+    """
+    if check_precision(precision, device) != "fp16":
+        return None
+    return torch.amp.GradScaler(torch.device(device).type)
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from results_store import SignatureIndex, open_results_store
+
+KEYS = {
+    "vanilla_rnn": ["hidden_size", "learning_rate", "model_type", "task_type"],
+    "lstm": ["dropout", "hidden_size", "model_type", "task_type"],
+}
+
+
+def _cfg(model_type, i):
+    cfg = {"model_type": model_type, "task_type": "neural", "hidden_size": 16 * i}
+    if model_type == "lstm":
+        cfg["dropout"] = 0.1
+    else:
+        cfg["learning_rate"] = 1e-3
+    return cfg
+
+
+def _index(path, model_type):
+    where = {"model_type": model_type, "task_type": "neural"}
+    return SignatureIndex(path, KEYS[model_type], where)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".db"])
+def test_index_survives_alternating_model_types(tmp_path, suffix):
+    path = tmp_path / f"results{suffix}"
+    store = open_results_store(path)
+    # Rows written without an index (e.g. by an older version), so the
+    # first index opened for each model type has to rebuild.
+    for i in range(3):
+        for model_type in KEYS:
+            store.append(_cfg(model_type, i))
+
+    for i in range(3, 7):
+        for model_type in KEYS:
+            index = _index(path, model_type)
+            cfg = _cfg(model_type, i)
+            store.append(cfg)
+            index.add([cfg])
+
+    for model_type in KEYS:
+        index = _index(path, model_type)
+        assert len(index) == 7
+        assert all(_cfg(model_type, i) in index for i in range(7))
+
+
+def test_index_rebuilds_when_keyset_lines_are_missing(tmp_path):
+    path = tmp_path / "results.csv"
+    store = open_results_store(path)
+    index = _index(path, "lstm")
+    for i in range(4):
+        cfg = _cfg("lstm", i)
+        store.append(cfg)
+        index.add([cfg])
+
+    lines = index.path.read_text().splitlines(keepends=True)
+    index.path.write_text("".join(lines[:1]))
+
+    assert len(_index(path, "lstm")) == 4